@@ -10,6 +10,7 @@ from app.db.base import Base
 from app.models import (  # noqa: F401
     Contribution,
     GuestSession,
+    IdempotencyKey,
     LinkPreview,
     OAuthAccount,
     RealtimeEvent,
@@ -0,0 +1,25 @@
+"""add wishlist version and per-event version
+
+Revision ID: 20261016_01
+Revises: 20260221_01
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '20261016_01'
+down_revision = '20260221_01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('wishlists', sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('realtime_events', sa.Column('version', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('realtime_events', 'version')
+    op.drop_column('wishlists', 'version')
@@ -0,0 +1,23 @@
+"""add realtime event compaction marker to wishlists
+
+Revision ID: 20261016_02
+Revises: 20261016_01
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '20261016_02'
+down_revision = '20261016_01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('wishlists', sa.Column('events_compacted_through', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('wishlists', 'events_compacted_through')
@@ -0,0 +1,152 @@
+"""optionally convert realtime_events into monthly range partitions (PostgreSQL only)
+
+Opt in with: alembic -x partition_events=true upgrade head
+Without the flag, or on other databases, the revision is recorded and nothing changes.
+
+Revision ID: 20261016_03
+Revises: 20261016_02
+Create Date: 2026-10-16
+"""
+
+from datetime import UTC, datetime, timedelta
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+revision = '20261016_03'
+down_revision = '20261016_02'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 2
+
+
+def _enabled() -> bool:
+    flag = context.get_x_argument(as_dictionary=True).get('partition_events', '')
+    return op.get_bind().dialect.name == 'postgresql' and flag.lower() in {'1', 'true', 'yes'}
+
+
+def _is_partitioned() -> bool:
+    return bool(
+        op.get_bind()
+        .execute(
+            sa.text(
+                'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p '
+                "JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = 'realtime_events')"
+            )
+        )
+        .scalar()
+    )
+
+
+def _month_start(moment: datetime) -> datetime:
+    return moment.astimezone(UTC).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month: datetime) -> datetime:
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def upgrade() -> None:
+    if not _enabled() or _is_partitioned():
+        return
+
+    bind = op.get_bind()
+    oldest = bind.execute(sa.text('SELECT min(created_at) FROM realtime_events')).scalar()
+    now = datetime.now(UTC)
+
+    op.execute('ALTER TABLE realtime_events RENAME TO realtime_events_unpartitioned')
+    op.execute('ALTER SEQUENCE realtime_events_id_seq OWNED BY NONE')
+    op.execute('ALTER TABLE realtime_events_unpartitioned RENAME CONSTRAINT pk_realtime_events TO pk_realtime_events_unpartitioned')
+    op.execute(
+        'ALTER TABLE realtime_events_unpartitioned RENAME CONSTRAINT fk_realtime_events_wishlist_id_wishlists '
+        'TO fk_realtime_events_unpartitioned_wishlist_id'
+    )
+    for index in ('ix_realtime_events_wishlist_id', 'ix_realtime_events_item_id', 'ix_realtime_events_event_type'):
+        op.execute(f'DROP INDEX IF EXISTS {index}')
+
+    # the partition key has to be part of the primary key
+    op.execute(
+        """
+        CREATE TABLE realtime_events (
+            id integer NOT NULL DEFAULT nextval('realtime_events_id_seq'),
+            wishlist_id uuid NOT NULL,
+            event_type event_type NOT NULL,
+            item_id uuid,
+            payload json NOT NULL,
+            version integer,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            updated_at timestamptz NOT NULL DEFAULT now(),
+            CONSTRAINT pk_realtime_events PRIMARY KEY (id, created_at),
+            CONSTRAINT fk_realtime_events_wishlist_id_wishlists FOREIGN KEY (wishlist_id)
+                REFERENCES wishlists (id) ON DELETE CASCADE
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute('ALTER SEQUENCE realtime_events_id_seq OWNED BY realtime_events.id')
+    op.execute('CREATE TABLE realtime_events_default PARTITION OF realtime_events DEFAULT')
+
+    month = _month_start(oldest or now)
+    last = _month_start(now)
+    for _ in range(MONTHS_AHEAD):
+        last = _next_month(last)
+    while month <= last:
+        upper = _next_month(month)
+        op.execute(
+            f'CREATE TABLE realtime_events_y{month:%Y}m{month:%m} PARTITION OF realtime_events '
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        month = upper
+
+    op.create_index(op.f('ix_realtime_events_wishlist_id'), 'realtime_events', ['wishlist_id'], unique=False)
+    op.create_index(op.f('ix_realtime_events_item_id'), 'realtime_events', ['item_id'], unique=False)
+    op.create_index(op.f('ix_realtime_events_event_type'), 'realtime_events', ['event_type'], unique=False)
+
+    op.execute(
+        'INSERT INTO realtime_events (id, wishlist_id, event_type, item_id, payload, version, created_at, updated_at) '
+        'SELECT id, wishlist_id, event_type, item_id, payload, version, created_at, updated_at FROM realtime_events_unpartitioned'
+    )
+    op.execute('DROP TABLE realtime_events_unpartitioned')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql' or not _is_partitioned():
+        return
+
+    op.execute('ALTER TABLE realtime_events RENAME TO realtime_events_partitioned')
+    op.execute('ALTER SEQUENCE realtime_events_id_seq OWNED BY NONE')
+    op.execute('ALTER TABLE realtime_events_partitioned RENAME CONSTRAINT pk_realtime_events TO pk_realtime_events_partitioned')
+    op.execute(
+        'ALTER TABLE realtime_events_partitioned RENAME CONSTRAINT fk_realtime_events_wishlist_id_wishlists '
+        'TO fk_realtime_events_partitioned_wishlist_id'
+    )
+    for index in ('ix_realtime_events_wishlist_id', 'ix_realtime_events_item_id', 'ix_realtime_events_event_type'):
+        op.execute(f'DROP INDEX IF EXISTS {index}')
+
+    op.execute(
+        """
+        CREATE TABLE realtime_events (
+            id integer NOT NULL DEFAULT nextval('realtime_events_id_seq'),
+            wishlist_id uuid NOT NULL,
+            event_type event_type NOT NULL,
+            item_id uuid,
+            payload json NOT NULL,
+            version integer,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            updated_at timestamptz NOT NULL DEFAULT now(),
+            CONSTRAINT pk_realtime_events PRIMARY KEY (id),
+            CONSTRAINT fk_realtime_events_wishlist_id_wishlists FOREIGN KEY (wishlist_id)
+                REFERENCES wishlists (id) ON DELETE CASCADE
+        )
+        """
+    )
+    op.execute('ALTER SEQUENCE realtime_events_id_seq OWNED BY realtime_events.id')
+    op.execute(
+        'INSERT INTO realtime_events (id, wishlist_id, event_type, item_id, payload, version, created_at, updated_at) '
+        'SELECT id, wishlist_id, event_type, item_id, payload, version, created_at, updated_at FROM realtime_events_partitioned'
+    )
+    op.execute('DROP TABLE realtime_events_partitioned CASCADE')
+    op.create_index(op.f('ix_realtime_events_wishlist_id'), 'realtime_events', ['wishlist_id'], unique=False)
+    op.create_index(op.f('ix_realtime_events_item_id'), 'realtime_events', ['item_id'], unique=False)
+    op.create_index(op.f('ix_realtime_events_event_type'), 'realtime_events', ['event_type'], unique=False)
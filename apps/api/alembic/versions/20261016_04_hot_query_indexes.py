@@ -0,0 +1,78 @@
+"""composite indexes for the hot query paths, drop indexes they make redundant
+
+Indexes are built CONCURRENTLY on PostgreSQL, so the migration runs outside a transaction.
+
+Revision ID: 20261016_04
+Revises: 20261016_03
+Create Date: 2026-10-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '20261016_04'
+down_revision = '20261016_03'
+branch_labels = None
+depends_on = None
+
+# (index, table, columns, postgresql include)
+NEW_INDEXES = [
+    ('ix_realtime_events_wishlist_id_id', 'realtime_events', ['wishlist_id', 'id'], None),
+    ('ix_wishlist_items_wishlist_id_position', 'wishlist_items', ['wishlist_id', 'position'], None),
+    ('ix_contributions_guest_session_id_item_id', 'contributions', ['guest_session_id', 'item_id'], ['amount']),
+]
+
+# leading-column prefixes of the new indexes, and the plain copy of the share_slug unique constraint
+REDUNDANT_INDEXES = [
+    ('ix_realtime_events_wishlist_id', 'realtime_events', ['wishlist_id']),
+    ('ix_wishlist_items_wishlist_id', 'wishlist_items', ['wishlist_id']),
+    ('ix_contributions_guest_session_id', 'contributions', ['guest_session_id']),
+    ('ix_wishlists_share_slug', 'wishlists', ['share_slug']),
+]
+
+
+def _concurrently(table: str) -> bool:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return False
+    # partitioned parents cannot be indexed concurrently; the index cascades to every partition instead
+    partitioned = bind.execute(
+        sa.text(
+            'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p '
+            'JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :table)'
+        ),
+        {'table': table},
+    ).scalar()
+    return not partitioned
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, include in NEW_INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=False,
+                if_not_exists=True,
+                postgresql_concurrently=_concurrently(table),
+                postgresql_include=include or [],
+            )
+        for name, table, _ in REDUNDANT_INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=_concurrently(table))
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in REDUNDANT_INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=False,
+                if_not_exists=True,
+                postgresql_concurrently=_concurrently(table),
+            )
+        for name, table, _, _ in NEW_INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=_concurrently(table))
@@ -0,0 +1,37 @@
+"""add idempotency keys for guest mutations
+
+Revision ID: 20261017_02
+Revises: 20261016_04
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '20261017_02'
+down_revision = '20261016_04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'idempotency_keys',
+        sa.Column('guest_session_id', sa.Uuid(), nullable=False),
+        sa.Column('key', sa.String(length=255), nullable=False),
+        sa.Column('fingerprint', sa.String(length=64), nullable=False),
+        sa.Column('status_code', sa.Integer(), nullable=False),
+        sa.Column('response', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ['guest_session_id'], ['guest_sessions.id'], name=op.f('fk_idempotency_keys_guest_session_id_guest_sessions'), ondelete='CASCADE'
+        ),
+        sa.PrimaryKeyConstraint('guest_session_id', 'key', name=op.f('pk_idempotency_keys')),
+    )
+    op.create_index(op.f('ix_idempotency_keys_created_at'), 'idempotency_keys', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_idempotency_keys_created_at'), table_name='idempotency_keys')
+    op.drop_table('idempotency_keys')
@@ -0,0 +1,28 @@
+"""add the wishlist_updated realtime event type
+
+ALTER TYPE ... ADD VALUE cannot run inside a transaction block before PostgreSQL 12, so it runs in an autocommit block.
+
+Revision ID: 20261017_03
+Revises: 20261017_02
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+
+
+revision = '20261017_03'
+down_revision = '20261017_02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE event_type ADD VALUE IF NOT EXISTS 'wishlist_updated'")
+
+
+def downgrade() -> None:
+    # PostgreSQL cannot drop a value from an enum type; relabel the events so the previous release can still read them
+    op.execute("UPDATE realtime_events SET event_type = 'item_updated' WHERE event_type = 'wishlist_updated'")
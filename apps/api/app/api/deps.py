@@ -5,7 +5,7 @@ from fastapi import Cookie, Depends, Header, HTTPException, status
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.constants import ACCESS_COOKIE_NAME, GUEST_HEADER_NAME
+from app.core.constants import ACCESS_COOKIE_NAME, GUEST_HEADER_NAME, IDEMPOTENCY_HEADER_NAME
 from app.core.security import TokenPayloadError, decode_token
 from app.db.session import get_db
 from app.models.guest_session import GuestSession
@@ -56,6 +56,12 @@ async def get_guest_token(
     return guest_token
 
 
+async def get_idempotency_key(
+    idempotency_key: Annotated[str | None, Header(alias=IDEMPOTENCY_HEADER_NAME, max_length=255)] = None,
+) -> str | None:
+    return idempotency_key or None
+
+
 async def get_guest_session_from_token(
     db: Annotated[AsyncSession, Depends(get_db)],
     guest_token: Annotated[str | None, Depends(get_guest_token)],
@@ -84,3 +90,4 @@ DbSession = Annotated[AsyncSession, Depends(get_db)]
 CurrentUser = Annotated[User, Depends(get_current_user)]
 OptionalUser = Annotated[User | None, Depends(get_optional_user)]
 OptionalGuestSession = Annotated[GuestSession | None, Depends(get_guest_session_from_token)]
+IdempotencyKeyHeader = Annotated[str | None, Depends(get_idempotency_key)]
@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.routes import auth, items, public, system, wishlists, ws
+from app.api.routes import auth, items, public, sse, system, wishlists, ws
 
 api_router = APIRouter()
 api_router.include_router(system.router)
@@ -9,3 +9,4 @@ api_router.include_router(wishlists.router)
 api_router.include_router(public.router)
 api_router.include_router(items.router)
 api_router.include_router(ws.router)
+api_router.include_router(sse.router)
@@ -1,34 +1,48 @@
-﻿from datetime import UTC, datetime, timedelta
+﻿import asyncio
+from contextlib import suppress
+from datetime import UTC, datetime, timedelta
 from decimal import Decimal
+from typing import Annotated
 from uuid import UUID
 
-from fastapi import APIRouter, HTTPException, Query, status
+import orjson
+from fastapi import APIRouter, Header, HTTPException, Query, Response, status
 from sqlalchemy import select
 
-from app.api.deps import DbSession, OptionalGuestSession, OptionalUser
+from app.api.deps import DbSession, IdempotencyKeyHeader, OptionalGuestSession, OptionalUser
 from app.core.config import get_settings
+from app.core.constants import GUEST_HEADER_NAME
 from app.core.security import create_guest_token
-from app.models.contribution import Contribution
 from app.models.enums import EventType, ItemMode, ItemStatus, WishlistStatus
 from app.models.guest_session import GuestSession
-from app.models.realtime_event import RealtimeEvent
 from app.models.reservation import Reservation
-from app.models.wishlist_item import WishlistItem
+from app.models.wishlist import Wishlist
+from app.realtime.frames import event_message
+from app.realtime.manager import connection_manager
 from app.schemas.public import (
     ContributionRequest,
     ContributionResponse,
     EventsResponse,
+    GuestActionResult,
+    GuestActionsRequest,
+    GuestActionsResponse,
     GuestSessionCreateRequest,
     GuestSessionResponse,
     ReservationResponse,
 )
 from app.schemas.wishlist import PublicWishlistView
-from app.services.event_service import publish_event
+from app.services.contribution_service import add_group_contribution
+from app.services.event_service import get_public_snapshot, latest_event_id, load_events_after, publish_event
+from app.services.idempotency_service import commit_recording_response, idempotent_request, replay_recorded_response
+from app.services.reservation_service import release_guest_reservation, reserve_item_for_guest
 from app.services.wishlist_service import (
-    build_guest_item_view,
+    build_item_state,
     build_owner_item_view,
     calculate_progress,
+    get_guest_contribution_totals,
+    get_public_item_or_404,
     get_public_wishlist_or_404,
+    get_published_wishlist_or_404,
 )
 
 router = APIRouter(prefix='/public', tags=['public'])
@@ -51,37 +65,86 @@ def _validate_guest_session_for_wishlist(
     return guest_session
 
 
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip().removeprefix('W/') for candidate in if_none_match.split(',')}
+    return '*' in candidates or etag in candidates
+
+
+async def _guest_reserved_item_ids(db: DbSession, guest_session_id: UUID) -> set[str]:
+    result = await db.execute(
+        select(Reservation.item_id).where(
+            Reservation.guest_session_id == guest_session_id,
+            Reservation.is_active.is_(True),
+        )
+    )
+    return {str(item_id) for item_id in result.scalars().all()}
+
+
 @router.get('/w/{share_slug}', response_model=PublicWishlistView)
 async def get_public_wishlist(
     share_slug: str,
     db: DbSession,
     user: OptionalUser,
     guest_session: OptionalGuestSession,
-) -> PublicWishlistView:
-    wishlist = await get_public_wishlist_or_404(db=db, slug=share_slug)
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> Response:
+    wishlist = await get_published_wishlist_or_404(db=db, slug=share_slug)
     guest_session = _validate_guest_session_for_wishlist(guest_session, wishlist.id)
+    version = wishlist.version
 
     if user and user.id == wishlist.owner_id:
         viewer_kind = 'owner'
-        items = [build_owner_item_view(item) for item in wishlist.items if item.status != ItemStatus.ARCHIVED]
     else:
         viewer_kind = 'guest' if guest_session else 'anonymous'
-        items = [
-            build_guest_item_view(item, guest_session)
-            for item in wishlist.items
-            if item.status != ItemStatus.ARCHIVED
-        ]
-
-    return PublicWishlistView(
-        id=wishlist.id,
-        title=wishlist.title,
-        description=wishlist.description,
-        currency=wishlist.currency,
-        status=wishlist.status,
-        share_slug=wishlist.share_slug or share_slug,
-        viewer_kind=viewer_kind,
-        items=items,
-    )
+
+    # every change to the shared view publishes an event and bumps the version, including the
+    # guest's own reservations and contributions, so the version identifies the response
+    etag = f'"v{version}-{viewer_kind}-{guest_session.id.hex}"' if guest_session else f'"v{version}-{viewer_kind}"'
+    headers = {
+        'ETag': etag,
+        'Cache-Control': 'no-cache' if viewer_kind == 'anonymous' else 'private, no-cache',
+        'Vary': f'Cookie, {GUEST_HEADER_NAME}',
+    }
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if viewer_kind == 'owner':
+        wishlist = await get_public_wishlist_or_404(db=db, slug=share_slug)
+        view = PublicWishlistView(
+            id=wishlist.id,
+            title=wishlist.title,
+            description=wishlist.description,
+            currency=wishlist.currency,
+            status=wishlist.status,
+            share_slug=wishlist.share_slug or share_slug,
+            version=version,
+            viewer_kind=viewer_kind,
+            items=[build_owner_item_view(item) for item in wishlist.items if item.status != ItemStatus.ARCHIVED],
+        )
+        return Response(content=view.model_dump_json(), media_type='application/json', headers=headers)
+
+    if guest_session:
+        totals = await get_guest_contribution_totals(db, guest_session.id)
+        reserved = await _guest_reserved_item_ids(db, guest_session.id)
+    snapshot = await get_public_snapshot(db, share_slug=share_slug, version=version)
+    view = snapshot.message['wishlist']
+    if guest_session:
+        contributions = {str(item_id): str(total) for item_id, total in totals.items()}
+        view = {
+            **view,
+            'viewer_kind': viewer_kind,
+            'items': [
+                {
+                    **item,
+                    'reserved_by_you': item['id'] in reserved,
+                    'my_contribution': contributions.get(item['id'], item['my_contribution']),
+                }
+                for item in view['items']
+            ],
+        }
+    return Response(content=orjson.dumps(view), media_type='application/json', headers=headers)
 
 
 @router.post('/w/{share_slug}/guest-session', response_model=GuestSessionResponse)
@@ -90,7 +153,7 @@ async def create_guest_session(
     payload: GuestSessionCreateRequest,
     db: DbSession,
 ) -> GuestSessionResponse:
-    wishlist = await get_public_wishlist_or_404(db=db, slug=share_slug)
+    wishlist = await get_published_wishlist_or_404(db=db, slug=share_slug)
     settings = get_settings()
 
     expires_at = datetime.now(UTC) + timedelta(days=settings.guest_token_ttl_days)
@@ -121,52 +184,22 @@ async def create_guest_session(
     )
 
 
-@router.post('/w/{share_slug}/items/{item_id}/reserve', response_model=ReservationResponse)
-async def reserve_item(
-    share_slug: str,
-    item_id: UUID,
-    db: DbSession,
-    guest_session: OptionalGuestSession,
-) -> ReservationResponse:
-    wishlist = await get_public_wishlist_or_404(db=db, slug=share_slug)
-    guest_session = _validate_guest_session_for_wishlist(guest_session, wishlist.id)
-    if not guest_session:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Guest session is required')
-
+def _require_open(wishlist: Wishlist) -> None:
     if wishlist.status == WishlistStatus.CLOSED:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Wishlist is closed')
 
-    item = next((i for i in wishlist.items if i.id == item_id), None)
-    if not item:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Item not found')
+
+async def _reserve(db: DbSession, wishlist: Wishlist, item_id: UUID, guest_session_id: UUID) -> ReservationResponse:
+    _require_open(wishlist)
+    # lock the item like contributions and owner edits do, so the published states follow the event versions
+    item = await get_public_item_or_404(db, wishlist.id, item_id, for_update=True)
 
     if item.mode != ItemMode.SINGLE:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Only reservation is allowed for this item')
     if item.status != ItemStatus.ACTIVE:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Item is not active')
 
-    lock_result = await db.execute(select(Reservation).where(Reservation.item_id == item_id).with_for_update())
-    reservation = lock_result.scalar_one_or_none()
-
-    if reservation and reservation.is_active and reservation.guest_session_id != guest_session.id:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Item is already reserved')
-
-    now = datetime.now(UTC)
-    if reservation:
-        reservation.guest_session_id = guest_session.id
-        reservation.is_active = True
-        reservation.reserved_at = now
-        reservation.released_at = None
-    else:
-        db.add(
-            Reservation(
-                item_id=item.id,
-                guest_session_id=guest_session.id,
-                is_active=True,
-                reserved_at=now,
-                released_at=None,
-            )
-        )
+    await reserve_item_for_guest(db, item_id=item.id, guest_session_id=guest_session_id)
 
     await publish_event(
         db,
@@ -174,35 +207,14 @@ async def reserve_item(
         share_slug=wishlist.share_slug,
         event_type=EventType.ITEM_RESERVED,
         item_id=item.id,
-        payload={'item_id': str(item.id), 'is_reserved': True},
+        payload={'item_id': str(item.id), 'is_reserved': True, 'item': build_item_state(item, is_reserved=True)},
     )
-    await db.commit()
-
     return ReservationResponse(message='Item reserved', item_id=item.id, is_reserved=True)
 
 
-@router.delete('/w/{share_slug}/items/{item_id}/reserve', response_model=ReservationResponse)
-async def unreserve_item(
-    share_slug: str,
-    item_id: UUID,
-    db: DbSession,
-    guest_session: OptionalGuestSession,
-) -> ReservationResponse:
-    wishlist = await get_public_wishlist_or_404(db=db, slug=share_slug)
-    guest_session = _validate_guest_session_for_wishlist(guest_session, wishlist.id)
-    if not guest_session:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Guest session is required')
-
-    result = await db.execute(select(Reservation).where(Reservation.item_id == item_id).with_for_update())
-    reservation = result.scalar_one_or_none()
-    if not reservation or not reservation.is_active:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Reservation not found')
-
-    if reservation.guest_session_id != guest_session.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You can release only your reservation')
-
-    reservation.is_active = False
-    reservation.released_at = datetime.now(UTC)
+async def _unreserve(db: DbSession, wishlist: Wishlist, item_id: UUID, guest_session_id: UUID) -> ReservationResponse:
+    item = await get_public_item_or_404(db, wishlist.id, item_id, for_update=True)
+    await release_guest_reservation(db, item_id=item.id, guest_session_id=guest_session_id)
 
     await publish_event(
         db,
@@ -210,82 +222,43 @@ async def unreserve_item(
         share_slug=wishlist.share_slug,
         event_type=EventType.ITEM_UNRESERVED,
         item_id=item_id,
-        payload={'item_id': str(item_id), 'is_reserved': False},
+        payload={'item_id': str(item_id), 'is_reserved': False, 'item': build_item_state(item, is_reserved=False)},
     )
-    await db.commit()
-
     return ReservationResponse(message='Reservation released', item_id=item_id, is_reserved=False)
 
 
-@router.post('/w/{share_slug}/items/{item_id}/contributions', response_model=ContributionResponse)
-async def contribute_to_item(
-    share_slug: str,
-    item_id: UUID,
-    payload: ContributionRequest,
+async def _contribute(
     db: DbSession,
-    guest_session: OptionalGuestSession,
+    wishlist: Wishlist,
+    item_id: UUID,
+    guest_session_id: UUID,
+    requested: Decimal,
 ) -> ContributionResponse:
-    wishlist = await get_public_wishlist_or_404(db=db, slug=share_slug)
-    guest_session = _validate_guest_session_for_wishlist(guest_session, wishlist.id)
-    if not guest_session:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Guest session is required')
-
-    if wishlist.status == WishlistStatus.CLOSED:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Wishlist is closed')
-
-    item = next((i for i in wishlist.items if i.id == item_id), None)
-    if not item:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Item not found')
-
-    if item.mode != ItemMode.GROUP:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Only contributions are allowed for this item')
-    if item.status != ItemStatus.ACTIVE:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Item is not active')
-
-    locked_item_result = await db.execute(
-        select(WishlistItem).where(WishlistItem.id == item.id).with_for_update()
-    )
-    locked_item = locked_item_result.scalar_one()
-
-    target = locked_item.target_amount or locked_item.price
-    if not target or target <= 0:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Target amount is not set')
-
-    remaining = target - locked_item.collected_amount
-    if remaining <= 0:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Collection already completed')
-
-    requested = payload.amount
-    accepted = min(requested, remaining)
-    if accepted <= 0:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Minimum contribution is 1')
-
-    db.add(
-        Contribution(
-            item_id=locked_item.id,
-            guest_session_id=guest_session.id,
-            amount=accepted,
-            currency=wishlist.currency,
-        )
+    _require_open(wishlist)
+    item, accepted = await add_group_contribution(
+        db,
+        wishlist=wishlist,
+        item_id=item_id,
+        guest_session_id=guest_session_id,
+        amount=requested,
     )
-
-    locked_item.collected_amount = (locked_item.collected_amount or Decimal('0')) + accepted
-    progress = calculate_progress(locked_item.collected_amount, locked_item.target_amount, locked_item.price)
+    progress = calculate_progress(item.collected_amount, item.target_amount, item.price)
 
     await publish_event(
         db,
         wishlist_id=wishlist.id,
         share_slug=wishlist.share_slug,
         event_type=EventType.CONTRIBUTION_ADDED,
-        item_id=locked_item.id,
+        item_id=item.id,
         payload={
-            'item_id': str(locked_item.id),
+            'item_id': str(item.id),
             'accepted_amount': str(accepted),
-            'collected_amount': str(locked_item.collected_amount),
+            'collected_amount': str(item.collected_amount),
             'progress_percent': progress,
+            # group items are never reserved
+            'item': build_item_state(item, is_reserved=False),
         },
     )
-    await db.commit()
 
     message = 'Contribution added'
     if accepted < requested:
@@ -293,42 +266,174 @@ async def contribute_to_item(
 
     return ContributionResponse(
         message=message,
-        item_id=locked_item.id,
+        item_id=item.id,
         accepted_amount=accepted,
-        collected_amount=locked_item.collected_amount,
+        collected_amount=item.collected_amount,
         progress_percent=progress,
     )
 
 
+@router.post('/w/{share_slug}/items/{item_id}/reserve', response_model=ReservationResponse)
+async def reserve_item(
+    share_slug: str,
+    item_id: UUID,
+    db: DbSession,
+    guest_session: OptionalGuestSession,
+    idempotency_key: IdempotencyKeyHeader,
+) -> ReservationResponse | Response:
+    wishlist = await get_published_wishlist_or_404(db=db, slug=share_slug)
+    guest_session = _validate_guest_session_for_wishlist(guest_session, wishlist.id)
+    if not guest_session:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Guest session is required')
+
+    idempotent = idempotent_request(idempotency_key, guest_session.id, 'reserve', str(item_id))
+    if replayed := await replay_recorded_response(db, idempotent):
+        return replayed
+
+    response = await _reserve(db, wishlist, item_id, guest_session.id)
+    return await commit_recording_response(db, idempotent, response)
+
+
+@router.delete('/w/{share_slug}/items/{item_id}/reserve', response_model=ReservationResponse)
+async def unreserve_item(
+    share_slug: str,
+    item_id: UUID,
+    db: DbSession,
+    guest_session: OptionalGuestSession,
+    idempotency_key: IdempotencyKeyHeader,
+) -> ReservationResponse | Response:
+    wishlist = await get_published_wishlist_or_404(db=db, slug=share_slug)
+    guest_session = _validate_guest_session_for_wishlist(guest_session, wishlist.id)
+    if not guest_session:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Guest session is required')
+
+    idempotent = idempotent_request(idempotency_key, guest_session.id, 'unreserve', str(item_id))
+    if replayed := await replay_recorded_response(db, idempotent):
+        return replayed
+
+    response = await _unreserve(db, wishlist, item_id, guest_session.id)
+    return await commit_recording_response(db, idempotent, response)
+
+
+@router.post('/w/{share_slug}/items/{item_id}/contributions', response_model=ContributionResponse)
+async def contribute_to_item(
+    share_slug: str,
+    item_id: UUID,
+    payload: ContributionRequest,
+    db: DbSession,
+    guest_session: OptionalGuestSession,
+    idempotency_key: IdempotencyKeyHeader,
+) -> ContributionResponse | Response:
+    wishlist = await get_published_wishlist_or_404(db=db, slug=share_slug)
+    guest_session = _validate_guest_session_for_wishlist(guest_session, wishlist.id)
+    if not guest_session:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Guest session is required')
+
+    # the amount is part of the fingerprint: a retry has to repeat the request exactly
+    idempotent = idempotent_request(idempotency_key, guest_session.id, 'contribute', str(item_id), str(payload.amount))
+    if replayed := await replay_recorded_response(db, idempotent):
+        return replayed
+
+    response = await _contribute(db, wishlist, item_id, guest_session.id, payload.amount)
+    return await commit_recording_response(db, idempotent, response)
+
+
+@router.post('/w/{share_slug}/actions', response_model=GuestActionsResponse)
+async def apply_guest_actions(
+    share_slug: str,
+    payload: GuestActionsRequest,
+    db: DbSession,
+    guest_session: OptionalGuestSession,
+    idempotency_key: IdempotencyKeyHeader,
+) -> GuestActionsResponse | Response:
+    """Applies several reserve, unreserve and contribute actions in one transaction.
+
+    Each action runs in its own savepoint, so a failed one is reported in its result and the others still apply.
+    All events are written and broadcast together on commit.
+    """
+    wishlist = await get_published_wishlist_or_404(db=db, slug=share_slug)
+    guest_session = _validate_guest_session_for_wishlist(guest_session, wishlist.id)
+    if not guest_session:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Guest session is required')
+
+    idempotent = idempotent_request(
+        idempotency_key,
+        guest_session.id,
+        'actions',
+        *(f'{action.action} {action.item_id} {action.amount}' for action in payload.actions),
+    )
+    if replayed := await replay_recorded_response(db, idempotent):
+        return replayed
+
+    results: list[GuestActionResult | None] = [None] * len(payload.actions)
+    # rows are locked in item id order, so two batches over the same items cannot deadlock
+    for index, action in sorted(enumerate(payload.actions), key=lambda pair: pair[1].item_id):
+        try:
+            async with db.begin_nested():
+                if action.action == 'reserve':
+                    outcome = await _reserve(db, wishlist, action.item_id, guest_session.id)
+                elif action.action == 'unreserve':
+                    outcome = await _unreserve(db, wishlist, action.item_id, guest_session.id)
+                else:
+                    outcome = await _contribute(db, wishlist, action.item_id, guest_session.id, action.amount)
+        except HTTPException as exc:
+            results[index] = GuestActionResult(
+                action=action.action,
+                item_id=action.item_id,
+                status_code=exc.status_code,
+                detail=exc.detail,
+            )
+        else:
+            results[index] = GuestActionResult(
+                action=action.action,
+                item_id=action.item_id,
+                status_code=status.HTTP_200_OK,
+                result=outcome,
+            )
+
+    return await commit_recording_response(db, idempotent, GuestActionsResponse(results=results))
+
+
+async def _read_events(
+    db: DbSession,
+    wishlist: Wishlist,
+    share_slug: str,
+    cursor: int | None,
+    limit: int,
+) -> list[dict] | None:
+    """Events after the cursor, or None when that part of the history was compacted away."""
+    frames = connection_manager.replay_since(share_slug, cursor) if cursor is not None else None
+    if frames is not None:
+        return [frame.message for frame in frames[:limit]]
+    compacted_through = wishlist.events_compacted_through
+    if cursor is not None and compacted_through is not None and cursor < compacted_through:
+        return None
+    return [event_message(event) for event in await load_events_after(db, wishlist.id, cursor, limit)]
+
+
 @router.get('/w/{share_slug}/events', response_model=EventsResponse)
 async def get_events(
     share_slug: str,
     db: DbSession,
     cursor: int | None = Query(default=None, ge=0),
     limit: int = Query(default=50, ge=1, le=200),
+    wait: float = Query(default=0, ge=0, le=30),
 ) -> EventsResponse:
-    wishlist = await get_public_wishlist_or_404(db=db, slug=share_slug)
-
-    stmt = select(RealtimeEvent).where(RealtimeEvent.wishlist_id == wishlist.id)
-    if cursor is not None:
-        stmt = stmt.where(RealtimeEvent.id > cursor)
-
-    stmt = stmt.order_by(RealtimeEvent.id.asc()).limit(limit)
-    result = await db.execute(stmt)
-    events = result.scalars().all()
-
-    next_cursor = events[-1].id if events else cursor
-
-    return EventsResponse(
-        events=[
-            {
-                'id': event.id,
-                'event_type': event.event_type,
-                'item_id': event.item_id,
-                'payload': event.payload,
-                'created_at': event.created_at,
-            }
-            for event in events
-        ],
-        next_cursor=next_cursor,
-    )
+    wishlist = await get_published_wishlist_or_404(db=db, slug=share_slug)
+
+    with connection_manager.watch(share_slug) as changed:
+        events = await _read_events(db, wishlist, share_slug, cursor, limit)
+        if events is None:
+            return EventsResponse(events=[], next_cursor=await latest_event_id(db, wishlist.id), resync=True)
+        if not events and wait:
+            # give the pooled connection back while the request is parked
+            await db.close()
+            with suppress(TimeoutError):
+                async with asyncio.timeout(wait):
+                    await changed.wait()
+            if changed.is_set():
+                events = await _read_events(db, wishlist, share_slug, cursor, limit) or []
+
+    next_cursor = events[-1]['id'] if events else cursor
+
+    return EventsResponse(events=events, next_cursor=next_cursor)
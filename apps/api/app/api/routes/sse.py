@@ -0,0 +1,85 @@
+import asyncio
+from collections.abc import AsyncIterator
+from typing import Annotated
+
+from fastapi import APIRouter, Header, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+
+from app.api.deps import DbSession
+from app.realtime.manager import Subscriber, connection_manager
+from app.services.event_service import replay_events
+from app.services.wishlist_service import get_published_wishlist_or_404
+
+router = APIRouter(tags=['sse'])
+
+SSE_RETRY_MS = 2000
+SSE_KEEPALIVE_SECONDS = 15.0
+
+
+async def _event_stream(
+    share_slug: str,
+    subscriber: Subscriber,
+    keepalive: float = SSE_KEEPALIVE_SECONDS,
+) -> AsyncIterator[bytes]:
+    frames = subscriber.frames()
+    pending: asyncio.Future | None = None
+    try:
+        yield f'retry: {SSE_RETRY_MS}\n\n'.encode()
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(frames))
+            done, _ = await asyncio.wait({pending}, timeout=keepalive)
+            if not done:
+                yield b': keepalive\n\n'
+                continue
+            try:
+                frame = pending.result()
+            except StopAsyncIteration:
+                return
+            pending = None
+            yield frame.sse
+    finally:
+        if pending is not None:
+            pending.cancel()
+        connection_manager.disconnect(share_slug, subscriber)
+
+
+@router.get('/sse/public/w/{share_slug}')
+async def wishlist_events_sse(
+    share_slug: str,
+    db: DbSession,
+    cursor: int | None = Query(default=None, ge=0),
+    last_event_id: Annotated[int | None, Header(alias='Last-Event-ID', ge=0)] = None,
+) -> StreamingResponse:
+    wishlist = await get_published_wishlist_or_404(db=db, slug=share_slug)
+    if not connection_manager.has_capacity(share_slug):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail='Too many viewers, try again later',
+            headers={'Retry-After': str(SSE_RETRY_MS // 1000)},
+        )
+    if last_event_id is not None:
+        cursor = last_event_id
+
+    subscriber = connection_manager.subscribe(share_slug, paused=cursor is not None)
+    try:
+        if cursor is not None:
+            await replay_events(
+                db,
+                subscriber,
+                wishlist_id=wishlist.id,
+                share_slug=share_slug,
+                cursor=cursor,
+                compacted_through=wishlist.events_compacted_through,
+            )
+    except Exception:
+        connection_manager.disconnect(share_slug, subscriber)
+        raise
+    # the stream can stay open for hours, so it must not pin a pooled connection
+    await db.close()
+
+    return StreamingResponse(
+        _event_stream(share_slug, subscriber),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
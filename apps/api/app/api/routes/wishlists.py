@@ -22,8 +22,10 @@ from app.schemas.wishlist import (
 from app.services.event_service import publish_event
 from app.services.utils import generate_slug
 from app.services.wishlist_service import (
+    build_item_state,
     build_owner_item_view,
     ensure_slug_unique,
+    get_item_for_update,
     get_owner_wishlist_or_404,
 )
 
@@ -101,6 +103,20 @@ async def update_wishlist(
         setattr(wishlist, field, value)
 
     wishlist.updated_at = datetime.now(UTC)
+    if updates:
+        await publish_event(
+            db,
+            wishlist_id=wishlist.id,
+            share_slug=wishlist.share_slug,
+            event_type=EventType.WISHLIST_UPDATED,
+            payload={
+                'wishlist': {
+                    'title': wishlist.title,
+                    'description': wishlist.description,
+                    'currency': wishlist.currency,
+                },
+            },
+        )
     await db.commit()
     wishlist = await get_owner_wishlist_or_404(db=db, wishlist_id=wishlist_id, owner_id=user.id)
     return _owner_detail_response(wishlist)
@@ -127,7 +143,7 @@ async def publish_wishlist(wishlist_id: UUID, db: DbSession, user: CurrentUser)
         wishlist_id=wishlist.id,
         share_slug=wishlist.share_slug,
         event_type=EventType.WISHLIST_PUBLISHED,
-        payload={'wishlist_id': str(wishlist.id)},
+        payload={'wishlist_id': str(wishlist.id), 'status': wishlist.status.value},
     )
     await db.commit()
 
@@ -146,7 +162,7 @@ async def close_wishlist(wishlist_id: UUID, db: DbSession, user: CurrentUser) ->
         wishlist_id=wishlist.id,
         share_slug=wishlist.share_slug,
         event_type=EventType.WISHLIST_CLOSED,
-        payload={'wishlist_id': str(wishlist.id)},
+        payload={'wishlist_id': str(wishlist.id), 'status': wishlist.status.value},
     )
     await db.commit()
 
@@ -200,6 +216,7 @@ async def create_item(
             'item_id': str(item.id),
             'action': 'created',
             'title': item.title,
+            'item': build_item_state(item, is_reserved=False),
         },
     )
 
@@ -217,9 +234,8 @@ async def update_item(
     user: CurrentUser,
 ) -> OwnerWishlistDetail:
     wishlist = await get_owner_wishlist_or_404(db=db, wishlist_id=wishlist_id, owner_id=user.id)
-    item = next((item for item in wishlist.items if item.id == item_id), None)
-    if not item:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Item not found')
+    # the published state must include contributions and reservations committed since the wishlist was loaded
+    item = await get_item_for_update(db, wishlist.id, item_id)
 
     updates = payload.model_dump(exclude_unset=True)
     if 'product_url' in updates and updates['product_url'] is not None:
@@ -242,6 +258,7 @@ async def update_item(
         payload={
             'item_id': str(item.id),
             'action': 'updated',
+            'item': build_item_state(item),
         },
     )
 
@@ -253,9 +270,8 @@ async def update_item(
 @router.post('/{wishlist_id}/items/{item_id}/archive', response_model=OwnerWishlistDetail)
 async def archive_item(wishlist_id: UUID, item_id: UUID, db: DbSession, user: CurrentUser) -> OwnerWishlistDetail:
     wishlist = await get_owner_wishlist_or_404(db=db, wishlist_id=wishlist_id, owner_id=user.id)
-    item = next((item for item in wishlist.items if item.id == item_id), None)
-    if not item:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Item not found')
+    # the published state must include contributions and reservations committed since the wishlist was loaded
+    item = await get_item_for_update(db, wishlist.id, item_id)
 
     item.status = ItemStatus.ARCHIVED
 
@@ -268,6 +284,7 @@ async def archive_item(wishlist_id: UUID, item_id: UUID, db: DbSession, user: Cu
         payload={
             'item_id': str(item.id),
             'action': 'archived',
+            'item': build_item_state(item),
         },
     )
 
@@ -1,51 +1,185 @@
-from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
+from typing import Annotated
+from uuid import UUID
+
+import orjson
+from fastapi import APIRouter, Query, WebSocket, status
+from pydantic import ValidationError
 from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from app.api.deps import get_optional_user
+from app.core.config import get_settings
+from app.core.constants import ACCESS_COOKIE_NAME
 from app.db.session import SessionLocal
-from app.models.realtime_event import RealtimeEvent
 from app.models.wishlist import Wishlist
-from app.realtime.manager import connection_manager
+from app.realtime.encoding import Encoding, negotiate_encoding
+from app.realtime.frames import Frame
+from app.realtime.manager import MultiplexedWebSocket, Subscriber, connection_manager, owner_channel
+from app.schemas.public import RealtimeCommand
+from app.services.event_service import replay_events, send_snapshot
 
 router = APIRouter(tags=['ws'])
 
+OWNER_CHANNEL_NAME = 'owner'
+
+
+async def _find_public_wishlist(db: AsyncSession, share_slug: str) -> Wishlist | None:
+    result = await db.execute(select(Wishlist).where(Wishlist.share_slug == share_slug))
+    wishlist = result.scalar_one_or_none()
+    if not wishlist or wishlist.status.value not in {'published', 'closed'}:
+        return None
+    return wishlist
+
+
+async def _catch_up(
+    db: AsyncSession,
+    session_factory: async_sessionmaker[AsyncSession],
+    subscriber: Subscriber,
+    *,
+    wishlist: Wishlist,
+    cursor: int | None,
+    snapshot: bool,
+) -> None:
+    share_slug = wishlist.share_slug or ''
+    if snapshot:
+        # the version is read after subscribing, so every later change arrives as a delta
+        version_result = await db.execute(select(Wishlist.version).where(Wishlist.id == wishlist.id))
+        version = version_result.scalar_one()
+        # release the connection while waiting on the shared render, which needs one of its own
+        await db.commit()
+        await send_snapshot(session_factory, subscriber, share_slug=share_slug, version=version)
+    elif cursor is not None:
+        await replay_events(
+            db,
+            subscriber,
+            wishlist_id=wishlist.id,
+            share_slug=share_slug,
+            cursor=cursor,
+            compacted_through=wishlist.events_compacted_through,
+        )
+
 
 @router.websocket('/ws/public/w/{share_slug}')
 async def wishlist_events_ws(
     websocket: WebSocket,
     share_slug: str,
     cursor: int | None = Query(default=None, ge=0),
+    snapshot: bool = Query(default=False),
+    encoding: Annotated[Encoding | None, Query()] = None,
 ) -> None:
-    async with SessionLocal() as db:
-        wishlist_result = await db.execute(select(Wishlist).where(Wishlist.share_slug == share_slug))
-        wishlist = wishlist_result.scalar_one_or_none()
+    negotiated, subprotocol = negotiate_encoding(websocket.scope.get('subprotocols', []), encoding)
+    settings = get_settings()
+    subscriber: Subscriber | None = None
+    try:
+        async with SessionLocal() as db:
+            wishlist = await _find_public_wishlist(db, share_slug)
+            if not wishlist:
+                await websocket.close(code=1008)
+                return
+
+            if not connection_manager.has_capacity(share_slug):
+                await websocket.accept(subprotocol=subprotocol)
+                await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason='Too many viewers, try again later')
+                return
+
+            # live frames are held back until the catch-up is queued, so nothing is lost or sent twice
+            subscriber = await connection_manager.connect(
+                share_slug,
+                websocket,
+                paused=snapshot or cursor is not None,
+                encoding=negotiated,
+                subprotocol=subprotocol,
+            )
+            await _catch_up(db, SessionLocal, subscriber, wishlist=wishlist, cursor=cursor, snapshot=snapshot)
+
+        await subscriber.listen(
+            ping_interval=settings.realtime_ping_interval_seconds,
+            idle_timeout=settings.realtime_idle_timeout_seconds,
+        )
+    finally:
+        if subscriber is not None:
+            connection_manager.disconnect(share_slug, subscriber)
+
+
+def _reply(mux: MultiplexedWebSocket, message_type: str, channel: str | None, detail: str | None = None) -> None:
+    message = {'type': message_type, 'channel': channel}
+    if detail is not None:
+        message['detail'] = detail
+    mux.socket.send_control(Frame(message))
 
-        if not wishlist or wishlist.status.value not in {'published', 'closed'}:
-            await websocket.close(code=1008)
+
+async def _handle_command(
+    mux: MultiplexedWebSocket,
+    text: str,
+    *,
+    user_id: UUID | None,
+    session_factory: async_sessionmaker[AsyncSession],
+) -> None:
+    try:
+        command = RealtimeCommand.model_validate(orjson.loads(text))
+    except (orjson.JSONDecodeError, ValidationError):
+        _reply(mux, 'error', None, 'Invalid command')
+        return
+
+    name = command.channel
+    if command.action == 'unsubscribe':
+        mux.unsubscribe(name)
+        _reply(mux, 'unsubscribed', name)
+        return
+
+    if name in mux.channels:
+        _reply(mux, 'subscribed', name)
+        return
+    if mux.is_full:
+        # one socket may not hold enough channels to exhaust the connection caps for everyone
+        _reply(mux, 'error', name, 'Too many subscriptions on this socket')
+        return
+
+    if name == OWNER_CHANNEL_NAME:
+        if user_id is None:
+            _reply(mux, 'error', name, 'Authentication required')
+        elif mux.subscribe(name, owner_channel(user_id)) is None:
+            _reply(mux, 'error', name, 'Too many connections, try again later')
+        else:
+            _reply(mux, 'subscribed', name)
+        return
+
+    async with session_factory() as db:
+        wishlist = await _find_public_wishlist(db, name)
+        if not wishlist:
+            _reply(mux, 'error', name, 'Public wishlist not found')
             return
 
-        await connection_manager.connect(share_slug, websocket)
+        paused = command.snapshot or command.cursor is not None
+        subscriber = mux.subscribe(name, name, paused=paused)
+        if subscriber is None:
+            _reply(mux, 'error', name, 'Too many viewers, try again later')
+            return
+        _reply(mux, 'subscribed', name)
+        await _catch_up(db, session_factory, subscriber, wishlist=wishlist, cursor=command.cursor, snapshot=command.snapshot)
 
-        if cursor is not None:
-            result = await db.execute(
-                select(RealtimeEvent)
-                .where(RealtimeEvent.wishlist_id == wishlist.id, RealtimeEvent.id > cursor)
-                .order_by(RealtimeEvent.id.asc())
-                .limit(100)
-            )
-            events = result.scalars().all()
-            for event in events:
-                await websocket.send_json(
-                    {
-                        'id': event.id,
-                        'event_type': event.event_type.value,
-                        'item_id': str(event.item_id) if event.item_id else None,
-                        'payload': event.payload,
-                        'created_at': event.created_at.isoformat() if event.created_at else None,
-                    }
-                )
 
+@router.websocket('/ws/realtime')
+async def multiplexed_events_ws(
+    websocket: WebSocket,
+    encoding: Annotated[Encoding | None, Query()] = None,
+) -> None:
+    negotiated, subprotocol = negotiate_encoding(websocket.scope.get('subprotocols', []), encoding)
+    async with SessionLocal() as db:
+        user = await get_optional_user(db, websocket.cookies.get(ACCESS_COOKIE_NAME))
+    user_id = user.id if user else None
+
+    mux = await connection_manager.connect_multiplexed(websocket, encoding=negotiated, subprotocol=subprotocol)
+
+    async def on_message(text: str) -> None:
+        await _handle_command(mux, text, user_id=user_id, session_factory=SessionLocal)
+
+    settings = get_settings()
     try:
-        while True:
-            await websocket.receive_text()
-    except WebSocketDisconnect:
-        connection_manager.disconnect(share_slug, websocket)
+        await mux.socket.listen(
+            ping_interval=settings.realtime_ping_interval_seconds,
+            idle_timeout=settings.realtime_idle_timeout_seconds,
+            on_message=on_message,
+        )
+    finally:
+        mux.close()
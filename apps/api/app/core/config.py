@@ -33,6 +33,23 @@ class Settings(BaseSettings):
     link_preview_cache_hours: int = 24
     guest_token_ttl_days: int = 365
 
+    realtime_backend: Literal['postgres', 'memory'] = 'postgres'
+    realtime_send_queue_size: int = Field(default=256, ge=1)
+    realtime_slow_consumer_policy: Literal['disconnect', 'drop_oldest'] = 'disconnect'
+    realtime_history_size: int = Field(default=256, ge=1)
+    realtime_history_channels: int = Field(default=2048, ge=1)
+    realtime_coalesce_window_ms: int = Field(default=0, ge=0, le=1000)
+    realtime_ping_interval_seconds: float = Field(default=20.0, gt=0)
+    realtime_idle_timeout_seconds: float = Field(default=60.0, gt=0)
+    realtime_max_connections: int = Field(default=10000, ge=1)
+    realtime_max_connections_per_channel: int = Field(default=1000, ge=1)
+    realtime_max_subscriptions_per_socket: int = Field(default=32, ge=1)
+    realtime_event_retention_per_wishlist: int = Field(default=500, ge=1)
+    realtime_event_retention_days: int = Field(default=90, ge=0)
+
+    idempotency_key_ttl_hours: int = Field(default=24, ge=1)
+    idempotency_cache_size: int = Field(default=10000, ge=0)
+
     @property
     def cors_origins_list(self) -> list[str]:
         return [origin.strip() for origin in self.cors_origins.split(',') if origin.strip()]
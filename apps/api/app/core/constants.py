@@ -1,3 +1,5 @@
 ACCESS_COOKIE_NAME = 'wishlist_access_token'
 REFRESH_COOKIE_NAME = 'wishlist_refresh_token'
 GUEST_HEADER_NAME = 'X-Guest-Token'
+IDEMPOTENCY_HEADER_NAME = 'Idempotency-Key'
+MAX_GUEST_ACTIONS = 50
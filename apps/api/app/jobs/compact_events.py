@@ -0,0 +1,58 @@
+"""Realtime event retention job, meant to run from cron: python -m app.jobs.compact_events"""
+
+import asyncio
+import logging
+import sys
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.db.session import SessionLocal
+from app.services.retention_service import compact_realtime_events, maintain_event_partitions, purge_idempotency_keys
+
+logger = logging.getLogger(__name__)
+
+
+async def _run_step(name: str, step: Callable[[AsyncSession], Awaitable[Any]]) -> bool:
+    """Runs one step in its own transaction, so a failing step neither rolls back nor skips the others."""
+    async with SessionLocal() as db:
+        try:
+            result = await step(db)
+            await db.commit()
+        except Exception:
+            logger.exception('Retention step failed: %s', name)
+            return False
+    if result is not None:
+        logger.info('%s: %s', name, result)
+    return True
+
+
+async def run() -> bool:
+    """Runs every retention step and returns whether all of them succeeded."""
+    settings = get_settings()
+    steps: list[tuple[str, Callable[[AsyncSession], Awaitable[Any]]]] = [
+        (
+            'compacted realtime events',
+            lambda db: compact_realtime_events(
+                db,
+                keep=settings.realtime_event_retention_per_wishlist,
+                max_age_days=settings.realtime_event_retention_days,
+            ),
+        ),
+        ('maintained realtime event partitions', maintain_event_partitions),
+        ('purged expired idempotency keys', lambda db: purge_idempotency_keys(db, older_than_hours=settings.idempotency_key_ttl_hours)),
+    ]
+    results = [await _run_step(name, step) for name, step in steps]
+    return all(results)
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    if not asyncio.run(run()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
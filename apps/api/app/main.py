@@ -1,3 +1,6 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from authlib.integrations.starlette_client import OAuth
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -5,6 +8,17 @@ from starlette.middleware.sessions import SessionMiddleware
 
 from app.api.router import api_router
 from app.core.config import get_settings
+from app.realtime.backends import create_backend
+from app.realtime.manager import connection_manager
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    await connection_manager.start(create_backend(get_settings()))
+    try:
+        yield
+    finally:
+        await connection_manager.stop()
 
 
 def create_app() -> FastAPI:
@@ -16,6 +30,7 @@ def create_app() -> FastAPI:
         openapi_url=f"{settings.api_prefix}/openapi.json",
         docs_url=f"{settings.api_prefix}/docs",
         redoc_url=f"{settings.api_prefix}/redoc",
+        lifespan=lifespan,
     )
 
     app.add_middleware(
@@ -1,5 +1,6 @@
 from app.models.contribution import Contribution
 from app.models.guest_session import GuestSession
+from app.models.idempotency_key import IdempotencyKey
 from app.models.link_preview import LinkPreview
 from app.models.oauth_account import OAuthAccount
 from app.models.realtime_event import RealtimeEvent
@@ -11,6 +12,7 @@ from app.models.wishlist_item import WishlistItem
 __all__ = [
     'Contribution',
     'GuestSession',
+    'IdempotencyKey',
     'LinkPreview',
     'OAuthAccount',
     'RealtimeEvent',
@@ -1,7 +1,7 @@
 import uuid
 from decimal import Decimal
 
-from sqlalchemy import ForeignKey, Numeric, String, Uuid
+from sqlalchemy import ForeignKey, Index, Numeric, String, Uuid
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
@@ -10,13 +10,17 @@ from app.models.mixins import TimestampMixin
 
 class Contribution(TimestampMixin, Base):
     __tablename__ = 'contributions'
+    __table_args__ = (
+        # the public view groups a guest's contributions by item; on PostgreSQL the sums come from the index alone
+        Index('ix_contributions_guest_session_id_item_id', 'guest_session_id', 'item_id', postgresql_include=['amount']),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
     item_id: Mapped[uuid.UUID] = mapped_column(
         Uuid(as_uuid=True), ForeignKey('wishlist_items.id', ondelete='CASCADE'), nullable=False, index=True
     )
     guest_session_id: Mapped[uuid.UUID] = mapped_column(
-        Uuid(as_uuid=True), ForeignKey('guest_sessions.id', ondelete='CASCADE'), nullable=False, index=True
+        Uuid(as_uuid=True), ForeignKey('guest_sessions.id', ondelete='CASCADE'), nullable=False
     )
     amount: Mapped[Decimal] = mapped_column(Numeric(12, 2), nullable=False)
     currency: Mapped[str] = mapped_column(String(3), nullable=False)
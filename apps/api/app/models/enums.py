@@ -26,3 +26,4 @@ class EventType(str, enum.Enum):
     ITEM_ARCHIVED = 'item_archived'
     WISHLIST_PUBLISHED = 'wishlist_published'
     WISHLIST_CLOSED = 'wishlist_closed'
+    WISHLIST_UPDATED = 'wishlist_updated'
@@ -1,6 +1,6 @@
 import uuid
 
-from sqlalchemy import Enum, ForeignKey, Integer, JSON, Uuid
+from sqlalchemy import Enum, ForeignKey, Index, Integer, JSON, Uuid
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
@@ -10,15 +10,17 @@ from app.models.mixins import TimestampMixin
 
 class RealtimeEvent(TimestampMixin, Base):
     __tablename__ = 'realtime_events'
+    __table_args__ = (Index('ix_realtime_events_wishlist_id_id', 'wishlist_id', 'id'),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     wishlist_id: Mapped[uuid.UUID] = mapped_column(
-        Uuid(as_uuid=True), ForeignKey('wishlists.id', ondelete='CASCADE'), nullable=False, index=True
+        Uuid(as_uuid=True), ForeignKey('wishlists.id', ondelete='CASCADE'), nullable=False
     )
     event_type: Mapped[EventType] = mapped_column(
         Enum(EventType, name='event_type'), nullable=False, index=True
     )
     item_id: Mapped[uuid.UUID | None] = mapped_column(Uuid(as_uuid=True), nullable=True, index=True)
     payload: Mapped[dict] = mapped_column(JSON, nullable=False)
+    version: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
     wishlist = relationship('Wishlist', back_populates='events')
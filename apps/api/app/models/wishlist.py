@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import DateTime, Enum, ForeignKey, String, Text, Uuid
+from sqlalchemy import DateTime, Enum, ForeignKey, Integer, String, Text, Uuid
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
@@ -22,8 +22,11 @@ class Wishlist(TimestampMixin, Base):
     status: Mapped[WishlistStatus] = mapped_column(
         Enum(WishlistStatus, name='wishlist_status'), default=WishlistStatus.DRAFT, nullable=False
     )
-    share_slug: Mapped[str | None] = mapped_column(String(128), unique=True, nullable=True, index=True)
+    share_slug: Mapped[str | None] = mapped_column(String(128), unique=True, nullable=True)
     closed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    version: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
+    # id of the newest realtime event removed by compaction; older cursors must resync
+    events_compacted_through: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
     owner = relationship('User', back_populates='wishlists')
     items = relationship('WishlistItem', back_populates='wishlist', cascade='all, delete-orphan')
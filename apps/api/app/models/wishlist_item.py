@@ -1,7 +1,7 @@
 import uuid
 from decimal import Decimal
 
-from sqlalchemy import Enum, ForeignKey, Integer, Numeric, String, Text, Uuid
+from sqlalchemy import Enum, ForeignKey, Index, Integer, Numeric, String, Text, Uuid
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
@@ -11,10 +11,11 @@ from app.models.mixins import TimestampMixin
 
 class WishlistItem(TimestampMixin, Base):
     __tablename__ = 'wishlist_items'
+    __table_args__ = (Index('ix_wishlist_items_wishlist_id_position', 'wishlist_id', 'position'),)
 
     id: Mapped[uuid.UUID] = mapped_column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
     wishlist_id: Mapped[uuid.UUID] = mapped_column(
-        Uuid(as_uuid=True), ForeignKey('wishlists.id', ondelete='CASCADE'), nullable=False, index=True
+        Uuid(as_uuid=True), ForeignKey('wishlists.id', ondelete='CASCADE'), nullable=False
     )
     title: Mapped[str] = mapped_column(String(255), nullable=False)
     product_url: Mapped[str | None] = mapped_column(String(2048), nullable=True)
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from app.core.config import Settings
+from app.realtime.frames import Frame
+
+logger = logging.getLogger(__name__)
+
+MessageHandler = Callable[[str, Frame, str], Awaitable[None]]
+# called when messages may have been lost, e.g. while the listener was reconnecting
+GapHandler = Callable[[], None]
+
+PG_NOTIFY_CHANNEL = 'wishlist_realtime'
+PG_NOTIFY_MAX_BYTES = 7900
+
+
+class RealtimeBackend(ABC):
+    """Pub/sub transport that fans realtime messages out to every API worker."""
+
+    @abstractmethod
+    async def start(self, handler: MessageHandler, on_gap: GapHandler | None = None) -> None: ...
+
+    @abstractmethod
+    async def stop(self) -> None: ...
+
+    @abstractmethod
+    async def publish(self, channel: str, frame: Frame, origin: str) -> None: ...
+
+
+class InMemoryBackend(RealtimeBackend):
+    """Process-local backend; managers sharing one instance behave like separate workers."""
+
+    def __init__(self) -> None:
+        self._handlers: list[MessageHandler] = []
+
+    async def start(self, handler: MessageHandler, on_gap: GapHandler | None = None) -> None:
+        self._handlers.append(handler)
+
+    async def stop(self) -> None:
+        self._handlers.clear()
+
+    async def publish(self, channel: str, frame: Frame, origin: str) -> None:
+        for handler in list(self._handlers):
+            await handler(channel, frame, origin)
+
+
+class PostgresBackend(RealtimeBackend):
+    """LISTEN/NOTIFY backend on a dedicated asyncpg connection."""
+
+    def __init__(self, dsn: str, *, reconnect_delay: float = 1.0) -> None:
+        self._dsn = dsn
+        self._reconnect_delay = reconnect_delay
+        self._handler: MessageHandler | None = None
+        self._on_gap: GapHandler | None = None
+        self._listen_conn: Any = None
+        self._pool: Any = None
+        self._reconnect_task: asyncio.Task[None] | None = None
+        self._pending: set[asyncio.Task[None]] = set()
+        self._stopping = False
+
+    async def start(self, handler: MessageHandler, on_gap: GapHandler | None = None) -> None:
+        import asyncpg
+
+        self._handler = handler
+        self._on_gap = on_gap
+        self._stopping = False
+        self._pool = await asyncpg.create_pool(self._dsn, min_size=1, max_size=2)
+        await self._listen()
+
+    async def stop(self) -> None:
+        self._stopping = True
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self._listen_conn is not None and not self._listen_conn.is_closed():
+            await self._listen_conn.close()
+        self._listen_conn = None
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def publish(self, channel: str, frame: Frame, origin: str) -> None:
+        if self._pool is None:
+            return
+
+        # origin and channel never contain newlines, so the pre-encoded frame is forwarded verbatim
+        payload = f'{origin}\n{channel}\n{frame.text}'
+        if len(payload.encode()) > PG_NOTIFY_MAX_BYTES:
+            logger.warning('Realtime message on %s exceeds NOTIFY limit, sending without payload', channel)
+            keys = ('id', 'event_type', 'wishlist_id', 'item_id', 'version', 'created_at')
+            stub = {key: frame.message.get(key) for key in keys}
+            payload = f'{origin}\n{channel}\n{Frame({**stub, "payload": {}, "truncated": True}).text}'
+
+        try:
+            await self._pool.execute('SELECT pg_notify($1, $2)', PG_NOTIFY_CHANNEL, payload)
+        except Exception:
+            logger.exception('Failed to publish realtime message on %s', channel)
+
+    async def _listen(self) -> None:
+        import asyncpg
+
+        self._listen_conn = await asyncpg.connect(self._dsn)
+        self._listen_conn.add_termination_listener(self._on_terminated)
+        await self._listen_conn.add_listener(PG_NOTIFY_CHANNEL, self._on_notification)
+
+    def _on_notification(self, _connection: Any, _pid: int, _channel: str, payload: str) -> None:
+        try:
+            origin, channel, text = payload.split('\n', 2)
+        except ValueError:
+            logger.warning('Dropping malformed realtime notification')
+            return
+        if self._handler is not None:
+            task = asyncio.get_running_loop().create_task(self._handler(channel, Frame(text=text), origin))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    def _on_terminated(self, _connection: Any) -> None:
+        if self._stopping or self._reconnect_task is not None:
+            return
+        self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        try:
+            while not self._stopping:
+                await asyncio.sleep(self._reconnect_delay)
+                try:
+                    await self._listen()
+                except Exception:
+                    logger.warning('Realtime listener reconnect failed, retrying')
+                    continue
+                logger.info('Realtime listener reconnected')
+                # notifications sent while the listener was down are gone
+                if self._on_gap is not None:
+                    self._on_gap()
+                return
+        finally:
+            self._reconnect_task = None
+
+
+def create_backend(settings: Settings) -> RealtimeBackend:
+    if settings.realtime_backend == 'postgres':
+        return PostgresBackend(settings.database_url.replace('postgresql+asyncpg://', 'postgresql://', 1))
+    return InMemoryBackend()
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from typing import Any, Literal
+
+import orjson
+
+try:
+    import msgpack
+except ImportError:  # optional dependency, see the `msgpack` extra
+    msgpack = None
+
+Encoding = Literal['json', 'compact', 'msgpack']
+
+SUBPROTOCOLS: dict[str, Encoding] = {
+    'wishlist.json': 'json',
+    'wishlist.compact': 'compact',
+    'wishlist.msgpack': 'msgpack',
+}
+
+# positional layout of an event in the compact encodings; trailing fields are omitted when absent
+EVENT_FIELDS = ('id', 'event_type', 'wishlist_id', 'item_id', 'payload', 'version', 'created_at', 'coalesced_from', 'first_version')
+_REQUIRED_FIELDS = 7
+
+
+def available_encodings() -> set[Encoding]:
+    encodings: set[Encoding] = {'json', 'compact'}
+    if msgpack is not None:
+        encodings.add('msgpack')
+    return encodings
+
+
+def negotiate_encoding(offered: list[str], requested: str | None = None) -> tuple[Encoding, str | None]:
+    """Picks the wire encoding from the `?encoding=` flag or the first supported offered subprotocol.
+
+    Returns the encoding and the subprotocol to echo back when accepting the socket.
+    """
+    available = available_encodings()
+    for subprotocol in offered:
+        encoding = SUBPROTOCOLS.get(subprotocol)
+        if encoding is not None and encoding in available and requested in (None, encoding):
+            return encoding, subprotocol
+    if requested in available:
+        return requested, None
+    return 'json', None
+
+
+def compact_message(message: Any) -> Any:
+    if isinstance(message, list):
+        return [compact_message(entry) for entry in message]
+    if 'channel' in message and 'event' in message:
+        return {'channel': message['channel'], 'event': compact_message(message['event'])}
+    if 'event_type' not in message:
+        return message
+
+    values = [message.get(field) for field in EVENT_FIELDS]
+    while len(values) > _REQUIRED_FIELDS and values[-1] is None:
+        values.pop()
+    return values
+
+
+def encode_message(message: Any, encoding: Encoding) -> str | bytes:
+    if encoding == 'compact':
+        return orjson.dumps(compact_message(message)).decode()
+    if encoding == 'msgpack':
+        return msgpack.packb(compact_message(message))
+    return orjson.dumps(message).decode()
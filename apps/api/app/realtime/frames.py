@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+from typing import Any
+
+import orjson
+
+from app.models.realtime_event import RealtimeEvent
+from app.realtime.encoding import Encoding, encode_message
+
+Message = dict[str, Any] | list[dict[str, Any]]
+
+
+class Frame:
+    """Realtime message encoded at most once and shared by every subscriber."""
+
+    __slots__ = ('_message', '_text', '_sse', '_routed', '_encoded')
+
+    def __init__(self, message: Message | None = None, *, text: str | None = None) -> None:
+        if message is None and text is None:
+            raise ValueError('Frame requires a message or its encoded text')
+        self._message = message
+        self._text = text
+        self._sse: bytes | None = None
+        self._routed: dict[str, Frame] | None = None
+        self._encoded: dict[Encoding, str | bytes] | None = None
+
+    @property
+    def message(self) -> Message:
+        if self._message is None:
+            self._message = orjson.loads(self._text)
+        return self._message
+
+    @property
+    def event_id(self) -> int | None:
+        """Id of the last event carried by the frame, if it is a stored event."""
+        message = self.message
+        if isinstance(message, list):
+            ids = [entry.get('id') for entry in message]
+            ids = [event_id for event_id in ids if isinstance(event_id, int)]
+            return max(ids) if ids else None
+        event_id = message.get('id')
+        return event_id if isinstance(event_id, int) else None
+
+    @property
+    def version(self) -> int | None:
+        """Wishlist version reached once the frame is applied."""
+        message = self.message
+        if isinstance(message, list):
+            versions = [entry.get('version') for entry in message]
+            versions = [version for version in versions if isinstance(version, int)]
+            return max(versions) if versions else None
+        version = message.get('version')
+        return version if isinstance(version, int) else None
+
+    @property
+    def truncated(self) -> bool:
+        """The event's payload was left out to fit the cross-worker transport; subscribers must refetch it."""
+        message = self.message
+        return isinstance(message, dict) and message.get('truncated') is True
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = orjson.dumps(self._message).decode()
+        return self._text
+
+    def routed(self, channel: str) -> Frame:
+        """The frame wrapped in a channel envelope for multiplexed sockets, encoded once per channel."""
+        if self._routed is None:
+            self._routed = {}
+        routed = self._routed.get(channel)
+        if routed is None:
+            routed = self._routed[channel] = Frame(
+                {'channel': channel, 'event': self.message},
+                text=f'{{"channel":{orjson.dumps(channel).decode()},"event":{self.text}}}',
+            )
+        return routed
+
+    def encode(self, encoding: Encoding) -> str | bytes:
+        """Wire payload in the negotiated encoding; bytes are sent as binary websocket messages."""
+        if encoding == 'json':
+            return self.text
+        if self._encoded is None:
+            self._encoded = {}
+        encoded = self._encoded.get(encoding)
+        if encoded is None:
+            encoded = self._encoded[encoding] = encode_message(self.message, encoding)
+        return encoded
+
+    @property
+    def sse(self) -> bytes:
+        if self._sse is None:
+            event_id = self.event_id
+            prefix = f'id: {event_id}\n' if event_id is not None else ''
+            self._sse = f'{prefix}data: {self.text}\n\n'.encode()
+        return self._sse
+
+
+PING_FRAME = Frame({'type': 'ping'})
+PONG_FRAME = Frame({'type': 'pong'})
+# the requested history was compacted away; the client must reload the current view
+RESYNC_FRAME = Frame({'type': 'resync'})
+
+
+def event_message(event: RealtimeEvent) -> dict[str, Any]:
+    return {
+        'id': event.id,
+        'event_type': event.event_type.value,
+        'wishlist_id': str(event.wishlist_id),
+        'item_id': str(event.item_id) if event.item_id else None,
+        'payload': event.payload,
+        'version': event.version,
+        'created_at': event.created_at.isoformat() if event.created_at else None,
+    }
+
+
+def _coalesce_key(message: dict[str, Any]) -> str | None:
+    payload = message.get('payload') or {}
+    if message.get('item_id') and 'item' in payload:
+        return f"item:{message['item_id']}"
+    if 'item_ids' in payload:
+        return 'order'
+    return None
+
+
+def coalesce_frames(frames: list[Frame]) -> Frame:
+    """Merges a burst of frames into one, keeping only the latest state of each item.
+
+    A merged event takes the place of its latest occurrence, so the sequence still applies in order.
+    """
+    if len(frames) == 1:
+        return frames[0]
+
+    messages = [frame.message for frame in frames]
+    latest: dict[str, int] = {}
+    for index, message in enumerate(messages):
+        key = _coalesce_key(message)
+        if key is not None:
+            latest[key] = index
+
+    merged: dict[str, list[dict[str, Any]]] = {}
+    coalesced: list[dict[str, Any]] = []
+    for index, message in enumerate(messages):
+        key = _coalesce_key(message)
+        if key is None:
+            coalesced.append(message)
+        elif latest[key] != index:
+            merged.setdefault(key, []).append(message)
+        elif key in merged:
+            earlier = merged.pop(key)
+            coalesced.append(
+                {
+                    **message,
+                    'coalesced_from': [entry.get('id') for entry in earlier],
+                    'first_version': earlier[0].get('version'),
+                }
+            )
+        else:
+            coalesced.append(message)
+
+    return Frame(coalesced)
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from bisect import insort
+from collections import OrderedDict
+
+from app.realtime.frames import Frame
+
+
+class ChannelHistory:
+    """Most recent event frames of one channel, ordered by event id."""
+
+    def __init__(self, size: int) -> None:
+        self._size = size
+        self._frames: list[tuple[int, Frame]] = []
+        # every event with an id above the floor is still retained
+        self._floor: int | None = None
+        # latest version seen per wishlist; owner channels carry several wishlists
+        self._versions: dict[str, int] = {}
+
+    def clear(self) -> None:
+        self._frames.clear()
+        self._floor = None
+        self._versions.clear()
+
+    def append(self, event_id: int, frame: Frame) -> None:
+        self._track_version(frame)
+        if self._frames and event_id <= self._frames[-1][0]:
+            if any(existing_id == event_id for existing_id, _ in self._frames):
+                return
+            if self._floor is not None and event_id <= self._floor:
+                return
+            insort(self._frames, (event_id, frame), key=lambda entry: entry[0])
+        else:
+            self._frames.append((event_id, frame))
+
+        if len(self._frames) > self._size:
+            evicted_id, _ = self._frames.pop(0)
+            self._floor = evicted_id
+
+    def _track_version(self, frame: Frame) -> None:
+        message = frame.message
+        version = frame.version
+        if not isinstance(message, dict) or version is None or message.get('wishlist_id') is None:
+            return
+        wishlist_id = message['wishlist_id']
+        latest = self._versions.get(wishlist_id)
+        if latest is not None and version > latest + 1:
+            # an event between the last one seen and this one never arrived; drop what would hide that
+            self.clear()
+        self._versions[wishlist_id] = version if latest is None else max(latest, version)
+
+    def covers(self, cursor: int) -> bool:
+        if self._floor is not None and cursor >= self._floor:
+            return True
+        return bool(self._frames) and cursor >= self._frames[0][0]
+
+    def since(self, cursor: int) -> list[tuple[int, Frame]] | None:
+        if not self.covers(cursor):
+            return None
+        return [entry for entry in self._frames if entry[0] > cursor]
+
+
+class EventHistory:
+    """Bounded per-channel ring buffers with least-recently-used channel eviction."""
+
+    def __init__(self, *, size: int, max_channels: int) -> None:
+        self._size = size
+        self._max_channels = max_channels
+        self._channels: OrderedDict[str, ChannelHistory] = OrderedDict()
+
+    def append(self, channel: str, frame: Frame) -> None:
+        event_id = frame.event_id
+        if event_id is None:
+            return
+        if frame.truncated:
+            # a frame without its payload cannot be replayed; cursors before it must be served from the database
+            self._channels.pop(channel, None)
+            return
+
+        history = self._channels.get(channel)
+        if history is None:
+            history = self._channels[channel] = ChannelHistory(self._size)
+            if len(self._channels) > self._max_channels:
+                self._channels.popitem(last=False)
+        else:
+            self._channels.move_to_end(channel)
+        history.append(event_id, frame)
+
+    def clear(self) -> None:
+        self._channels.clear()
+
+    def since(self, channel: str, cursor: int) -> list[tuple[int, Frame]] | None:
+        history = self._channels.get(channel)
+        if history is None:
+            return None
+        return history.since(cursor)
@@ -1,30 +1,423 @@
-from collections import defaultdict
-from typing import Any
+import asyncio
+import logging
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from typing import Any, Literal
+from uuid import UUID, uuid4
 
-from fastapi import WebSocket
+from fastapi import WebSocket, WebSocketDisconnect, status
 
+from app.core.config import get_settings
+from app.realtime.backends import InMemoryBackend, RealtimeBackend
+from app.realtime.encoding import Encoding
+from app.realtime.frames import PING_FRAME, PONG_FRAME, Frame, coalesce_frames
+from app.realtime.history import EventHistory
+from app.realtime.snapshots import SnapshotCache
 
-class ConnectionManager:
-    def __init__(self) -> None:
-        self._connections: dict[str, set[WebSocket]] = defaultdict(set)
-
-    async def connect(self, channel: str, websocket: WebSocket) -> None:
-        await websocket.accept()
-        self._connections[channel].add(websocket)
-
-    def disconnect(self, channel: str, websocket: WebSocket) -> None:
-        if channel in self._connections and websocket in self._connections[channel]:
-            self._connections[channel].remove(websocket)
-            if not self._connections[channel]:
-                del self._connections[channel]
-
-    async def broadcast(self, channel: str, message: dict[str, Any]) -> None:
-        sockets = list(self._connections.get(channel, set()))
-        for socket in sockets:
+logger = logging.getLogger(__name__)
+
+SlowConsumerPolicy = Literal['disconnect', 'drop_oldest']
+
+# what sending to a websocket raises once its client has gone away
+SOCKET_GONE_ERRORS = (WebSocketDisconnect, RuntimeError, OSError)
+
+
+def owner_channel(owner_id: UUID | str) -> str:
+    """Channel carrying the events of every wishlist of one owner, drafts included."""
+    return f'owner:{owner_id}'
+
+
+def _is_replayed(frame: Frame, after_id: int | None, after_version: int | None) -> bool:
+    if after_id is not None:
+        event_id = frame.event_id
+        if event_id is not None and event_id <= after_id:
+            return True
+    if after_version is not None:
+        version = frame.version
+        if version is not None and version <= after_version:
+            return True
+    return False
+
+
+class Subscriber:
+    """Bounded outbound queue of one realtime client, independent of its transport."""
+
+    def __init__(self, *, max_queue: int, policy: SlowConsumerPolicy, paused: bool = False) -> None:
+        self.dropped = 0
+        self.close_code: int | None = None
+        self._max_queue = max_queue
+        self._policy = policy
+        self._paused = paused
+        self._control: deque[Frame] = deque()
+        self._backlog: deque[Frame] = deque()
+        self._queue: deque[Frame] = deque()
+        self._wakeup = asyncio.Event()
+        self._closing = False
+
+    @property
+    def is_closing(self) -> bool:
+        return self._closing
+
+    def enqueue(self, frame: Frame) -> bool:
+        if self._closing:
+            return False
+        if len(self._queue) >= self._max_queue:
+            if self._policy == 'drop_oldest':
+                self._queue.popleft()
+                self.dropped += 1
+            else:
+                self.close(status.WS_1013_TRY_AGAIN_LATER)
+                return False
+        self._queue.append(frame)
+        self._wakeup.set()
+        return True
+
+    def send_control(self, frame: Frame) -> None:
+        """Queues a liveness frame ahead of events, even while the subscriber is paused."""
+        if self._closing:
+            return
+        self._control.append(frame)
+        self._wakeup.set()
+
+    def replay(self, frames: list[Frame]) -> None:
+        if self._closing:
+            return
+        self._backlog.extend(frames)
+        self._wakeup.set()
+
+    def resume(self, after_id: int | None = None, *, after_version: int | None = None) -> None:
+        if after_id is not None or after_version is not None:
+            self._queue = deque(
+                frame for frame in self._queue if not _is_replayed(frame, after_id, after_version)
+            )
+        self._paused = False
+        self._wakeup.set()
+
+    def close(self, code: int | None = None) -> None:
+        if self._closing:
+            return
+        self._closing = True
+        self.close_code = code
+        self._control.clear()
+        self._backlog.clear()
+        self._queue.clear()
+        self._wakeup.set()
+
+    async def frames(self) -> AsyncIterator[Frame]:
+        while True:
+            self._wakeup.clear()
+            while self._control and not self._closing:
+                yield self._control.popleft()
+            while self._backlog and not self._closing:
+                yield self._backlog.popleft()
+            while self._queue and not self._paused and not self._closing:
+                yield self._queue.popleft()
+            if self._closing:
+                return
+            if not self._backlog and (self._paused or not self._queue):
+                await self._wakeup.wait()
+
+
+class WebSocketSubscriber(Subscriber):
+    def __init__(self, websocket: WebSocket, *, encoding: Encoding = 'json', **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.websocket = websocket
+        self.encoding = encoding
+        self._writer: asyncio.Task[None] | None = None
+        self._closer: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        self._writer = asyncio.get_running_loop().create_task(self._run())
+
+    def close(self, code: int | None = None) -> None:
+        if self.is_closing:
+            return
+        super().close(code)
+        if code is not None:
+            if self._writer:
+                self._writer.cancel()
+            self._closer = asyncio.get_running_loop().create_task(self._close_socket(code))
+
+    async def listen(
+        self,
+        *,
+        ping_interval: float,
+        idle_timeout: float,
+        on_message: Callable[[str], Awaitable[None]] | None = None,
+    ) -> None:
+        """Reads client messages until it disconnects or stays silent past the idle timeout.
+
+        A ping frame is sent after every quiet interval; any client message counts as a sign of life.
+        """
+        loop = asyncio.get_running_loop()
+        last_seen = loop.time()
+        while not self.is_closing:
             try:
-                await socket.send_json(message)
-            except Exception:
-                self.disconnect(channel, socket)
+                async with asyncio.timeout(ping_interval):
+                    message = await self.websocket.receive_text()
+            except TimeoutError:
+                if loop.time() - last_seen >= idle_timeout:
+                    logger.info('Reaping idle realtime websocket')
+                    self.close(status.WS_1001_GOING_AWAY)
+                    return
+                self.send_control(PING_FRAME)
+                continue
+            except WebSocketDisconnect:
+                return
+            last_seen = loop.time()
+            if message == 'ping':
+                self.send_control(PONG_FRAME)
+            elif on_message is not None:
+                await on_message(message)
+
+    async def _run(self) -> None:
+        try:
+            async for frame in self.frames():
+                payload = frame.encode(self.encoding)
+                if isinstance(payload, bytes):
+                    await self.websocket.send_bytes(payload)
+                else:
+                    await self.websocket.send_text(payload)
+        except SOCKET_GONE_ERRORS:
+            self._closing = True
+        except Exception:
+            logger.debug('Dropping realtime websocket after a failed send', exc_info=True)
+            self._closing = True
+
+    async def _close_socket(self, code: int) -> None:
+        try:
+            await self.websocket.close(code=code)
+        except SOCKET_GONE_ERRORS:
+            pass
+        except Exception:
+            logger.debug('Failed to close evicted websocket', exc_info=True)
+
+
+class ConnectionManager:
+    def __init__(
+        self,
+        backend: RealtimeBackend | None = None,
+        *,
+        max_queue: int | None = None,
+        slow_consumer_policy: SlowConsumerPolicy | None = None,
+        coalesce_window: float | None = None,
+        max_connections: int | None = None,
+        max_connections_per_channel: int | None = None,
+        max_subscriptions_per_socket: int | None = None,
+    ) -> None:
+        settings = get_settings()
+        self._connections: dict[str, set[Subscriber]] = {}
+        self._connection_count = 0
+        self._max_connections = max_connections or settings.realtime_max_connections
+        self._max_per_channel = max_connections_per_channel or settings.realtime_max_connections_per_channel
+        self._max_per_socket = max_subscriptions_per_socket or settings.realtime_max_subscriptions_per_socket
+        self._backend = backend or InMemoryBackend()
+        self._origin = uuid4().hex
+        self._max_queue = max_queue or settings.realtime_send_queue_size
+        self._policy: SlowConsumerPolicy = slow_consumer_policy or settings.realtime_slow_consumer_policy
+        self._publishing: set[asyncio.Task[None]] = set()
+        self._watchers: dict[str, set[asyncio.Event]] = {}
+        if coalesce_window is None:
+            coalesce_window = settings.realtime_coalesce_window_ms / 1000
+        self._coalesce_window = coalesce_window
+        self._pending: dict[str, list[Frame]] = {}
+        self._flushes: dict[str, asyncio.TimerHandle] = {}
+        self.history = EventHistory(size=settings.realtime_history_size, max_channels=settings.realtime_history_channels)
+        self.snapshots = SnapshotCache(max_channels=settings.realtime_history_channels)
+
+    async def start(self, backend: RealtimeBackend | None = None) -> None:
+        if backend is not None:
+            self._backend = backend
+        await self._backend.start(self._on_backend_message, self._on_backend_gap)
+
+    async def stop(self) -> None:
+        for channel in list(self._flushes):
+            self._flushes[channel].cancel()
+            self._flush(channel)
+        if self._publishing:
+            await asyncio.gather(*self._publishing, return_exceptions=True)
+        await self._backend.stop()
+
+    async def connect(
+        self,
+        channel: str,
+        websocket: WebSocket,
+        *,
+        paused: bool = False,
+        encoding: Encoding = 'json',
+        subprotocol: str | None = None,
+    ) -> WebSocketSubscriber:
+        await websocket.accept(subprotocol=subprotocol)
+        subscriber = WebSocketSubscriber(
+            websocket,
+            encoding=encoding,
+            max_queue=self._max_queue,
+            policy=self._policy,
+            paused=paused,
+        )
+        subscriber.start()
+        self._add(channel, subscriber)
+        return subscriber
+
+    async def connect_multiplexed(
+        self,
+        websocket: WebSocket,
+        *,
+        encoding: Encoding = 'json',
+        subprotocol: str | None = None,
+    ) -> 'MultiplexedWebSocket':
+        await websocket.accept(subprotocol=subprotocol)
+        socket = WebSocketSubscriber(websocket, encoding=encoding, max_queue=self._max_queue, policy=self._policy)
+        socket.start()
+        return MultiplexedWebSocket(self, socket, max_channels=self._max_per_socket)
+
+    def subscribe(self, channel: str, *, paused: bool = False) -> Subscriber:
+        subscriber = Subscriber(max_queue=self._max_queue, policy=self._policy, paused=paused)
+        self._add(channel, subscriber)
+        return subscriber
+
+    @property
+    def connection_count(self) -> int:
+        return self._connection_count
+
+    def has_capacity(self, channel: str) -> bool:
+        if self._connection_count >= self._max_connections:
+            return False
+        return len(self._connections.get(channel, ())) < self._max_per_channel
+
+    def _add(self, channel: str, subscriber: Subscriber) -> None:
+        self._connections.setdefault(channel, set()).add(subscriber)
+        self._connection_count += 1
+
+    def disconnect(self, channel: str, subscriber: Subscriber) -> None:
+        subscribers = self._connections.get(channel)
+        if not subscribers or subscriber not in subscribers:
+            return
+        subscribers.discard(subscriber)
+        self._connection_count -= 1
+        subscriber.close()
+        if not subscribers:
+            del self._connections[channel]
+
+    @contextmanager
+    def watch(self, channel: str) -> Iterator[asyncio.Event]:
+        changed = asyncio.Event()
+        self._watchers.setdefault(channel, set()).add(changed)
+        try:
+            yield changed
+        finally:
+            watchers = self._watchers.get(channel)
+            if watchers is not None:
+                watchers.discard(changed)
+                if not watchers:
+                    del self._watchers[channel]
+
+    def replay_since(self, channel: str, cursor: int) -> list[Frame] | None:
+        entries = self.history.since(channel, cursor)
+        return None if entries is None else [frame for _, frame in entries]
+
+    async def broadcast(self, channel: str, message: dict[str, Any] | Frame) -> None:
+        frame = message if isinstance(message, Frame) else Frame(message)
+        self._deliver_local(channel, frame)
+        await self._backend.publish(channel, frame, self._origin)
+
+    def broadcast_nowait(self, channel: str, message: dict[str, Any] | Frame) -> None:
+        frame = message if isinstance(message, Frame) else Frame(message)
+        self._deliver_local(channel, frame)
+        task = asyncio.get_running_loop().create_task(self._backend.publish(channel, frame, self._origin))
+        self._publishing.add(task)
+        task.add_done_callback(self._publishing.discard)
+
+    async def _on_backend_message(self, channel: str, frame: Frame, origin: str) -> None:
+        if origin == self._origin:
+            return
+        self._deliver_local(channel, frame)
+
+    def _on_backend_gap(self) -> None:
+        # events of other workers may be missing from the history, so no cursor can be trusted to it
+        logger.warning('Realtime messages may have been lost, clearing the event history')
+        self.history.clear()
+
+    def _deliver_local(self, channel: str, frame: Frame) -> None:
+        self.history.append(channel, frame)
+        for changed in self._watchers.get(channel, ()):
+            changed.set()
+        if channel not in self._connections:
+            return
+        if self._coalesce_window <= 0:
+            self._fan_out(channel, frame)
+            return
+        self._pending.setdefault(channel, []).append(frame)
+        if channel not in self._flushes:
+            loop = asyncio.get_running_loop()
+            self._flushes[channel] = loop.call_later(self._coalesce_window, self._flush, channel)
+
+    def _flush(self, channel: str) -> None:
+        self._flushes.pop(channel, None)
+        frames = self._pending.pop(channel, None)
+        if frames and channel in self._connections:
+            self._fan_out(channel, coalesce_frames(frames))
+
+    def _fan_out(self, channel: str, frame: Frame) -> None:
+        subscribers = self._connections.get(channel)
+        if not subscribers:
+            return
+        for subscriber in list(subscribers):
+            if not subscriber.enqueue(frame) and subscriber.is_closing:
+                logger.info('Dropping closed or slow realtime subscriber on %s', channel)
+                self.disconnect(channel, subscriber)
+
+
+class MultiplexedWebSocket:
+    """One websocket carrying many channels.
+
+    Every channel keeps its own subscriber, so pausing, replay and resume work per channel; a pump
+    forwards its frames, wrapped in a channel envelope, into the socket's single outbound queue.
+    """
+
+    def __init__(self, manager: ConnectionManager, socket: WebSocketSubscriber, *, max_channels: int) -> None:
+        self.socket = socket
+        self._manager = manager
+        self._max_channels = max_channels
+        self._channels: dict[str, tuple[str, Subscriber, asyncio.Task[None]]] = {}
+
+    @property
+    def channels(self) -> set[str]:
+        return set(self._channels)
+
+    @property
+    def is_full(self) -> bool:
+        return len(self._channels) >= self._max_channels
+
+    def subscribe(self, name: str, channel: str, *, paused: bool = False) -> Subscriber | None:
+        existing = self._channels.get(name)
+        if existing is not None:
+            return existing[1]
+        if self.is_full or not self._manager.has_capacity(channel):
+            return None
+        subscriber = self._manager.subscribe(channel, paused=paused)
+        pump = asyncio.get_running_loop().create_task(self._pump(name, subscriber))
+        self._channels[name] = (channel, subscriber, pump)
+        return subscriber
+
+    def unsubscribe(self, name: str) -> None:
+        entry = self._channels.pop(name, None)
+        if entry is not None:
+            channel, subscriber, _ = entry
+            self._manager.disconnect(channel, subscriber)
+
+    def close(self) -> None:
+        for name in list(self._channels):
+            self.unsubscribe(name)
+        self.socket.close()
+
+    async def _pump(self, name: str, subscriber: Subscriber) -> None:
+        async for frame in subscriber.frames():
+            if not self.socket.enqueue(frame.routed(name)):
+                break
+        if subscriber.close_code is not None:
+            self.socket.close(subscriber.close_code)
 
 
 connection_manager = ConnectionManager()
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+
+from app.realtime.frames import Frame
+
+
+class SnapshotCache:
+    """Latest rendered snapshot per channel, rendered at most once per version.
+
+    Concurrent requests for a version that is still rendering share the same render.
+    """
+
+    def __init__(self, *, max_channels: int) -> None:
+        self._max_channels = max_channels
+        self._snapshots: OrderedDict[str, tuple[int, Frame]] = OrderedDict()
+        self._rendering: dict[tuple[str, int], asyncio.Future[Frame]] = {}
+
+    async def get(self, channel: str, version: int, render: Callable[[], Awaitable[Frame]]) -> Frame:
+        cached = self._snapshots.get(channel)
+        if cached is not None and cached[0] == version:
+            self._snapshots.move_to_end(channel)
+            return cached[1]
+
+        key = (channel, version)
+        rendering = self._rendering.get(key)
+        if rendering is None:
+            rendering = self._rendering[key] = asyncio.ensure_future(render())
+            rendering.add_done_callback(lambda future: self._store(channel, version, future))
+        return await asyncio.shield(rendering)
+
+    def _store(self, channel: str, version: int, future: asyncio.Future[Frame]) -> None:
+        self._rendering.pop((channel, version), None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        cached = self._snapshots.get(channel)
+        if cached is not None and cached[0] > version:
+            return
+        self._snapshots[channel] = (version, future.result())
+        self._snapshots.move_to_end(channel)
+        if len(self._snapshots) > self._max_channels:
+            self._snapshots.popitem(last=False)
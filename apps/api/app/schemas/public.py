@@ -1,9 +1,11 @@
 from datetime import datetime
 from decimal import Decimal
+from typing import Literal
 from uuid import UUID
 
-from pydantic import BaseModel, Field, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl, model_validator
 
+from app.core.constants import MAX_GUEST_ACTIONS
 from app.models.enums import EventType
 
 
@@ -36,17 +38,57 @@ class ContributionResponse(BaseModel):
     progress_percent: float
 
 
+class GuestAction(BaseModel):
+    action: Literal['reserve', 'unreserve', 'contribute']
+    item_id: UUID
+    amount: Decimal | None = Field(default=None, gt=0)
+
+    @model_validator(mode='after')
+    def require_amount_for_contributions(self) -> 'GuestAction':
+        if (self.action == 'contribute') != (self.amount is not None):
+            raise ValueError('amount is required for contributions and only allowed there')
+        return self
+
+
+class GuestActionsRequest(BaseModel):
+    actions: list[GuestAction] = Field(min_length=1, max_length=MAX_GUEST_ACTIONS)
+
+
+class GuestActionResult(BaseModel):
+    action: Literal['reserve', 'unreserve', 'contribute']
+    item_id: UUID
+    status_code: int
+    detail: str | None = None
+    result: ReservationResponse | ContributionResponse | None = None
+
+
+class GuestActionsResponse(BaseModel):
+    # in request order; failed actions carry the status code and detail the single-item endpoint would return
+    results: list[GuestActionResult]
+
+
 class RealtimeEventView(BaseModel):
     id: int
     event_type: EventType
+    wishlist_id: UUID | None = None
     item_id: UUID | None
     payload: dict
+    version: int | None = None
     created_at: datetime
 
 
+class RealtimeCommand(BaseModel):
+    action: Literal['subscribe', 'unsubscribe']
+    channel: str = Field(min_length=1, max_length=120)
+    cursor: int | None = Field(default=None, ge=0)
+    snapshot: bool = False
+
+
 class EventsResponse(BaseModel):
     events: list[RealtimeEventView]
     next_cursor: int | None
+    # the cursor predates compacted history: reload the wishlist and continue from next_cursor
+    resync: bool = False
 
 
 class ItemPreviewRequest(BaseModel):
@@ -124,5 +124,6 @@ class PublicWishlistView(BaseModel):
     currency: str
     status: WishlistStatus
     share_slug: str
+    version: int
     viewer_kind: Literal['anonymous', 'guest', 'owner']
     items: list[GuestItemView] | list[OwnerItemView]
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import uuid
+from datetime import UTC, datetime
+from decimal import Decimal
+
+from fastapi import HTTPException, status
+from sqlalchemy import Select, func, insert, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.contribution import Contribution
+from app.models.enums import ItemMode, ItemStatus
+from app.models.wishlist import Wishlist
+from app.models.wishlist_item import WishlistItem
+from app.services.wishlist_service import get_public_item_or_404
+
+
+def _remaining_or_409(item: WishlistItem) -> Decimal:
+    if item.mode != ItemMode.GROUP:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Only contributions are allowed for this item')
+    if item.status != ItemStatus.ACTIVE:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Item is not active')
+
+    target = item.target_amount or item.price
+    if not target or target <= 0:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Target amount is not set')
+
+    remaining = target - item.collected_amount
+    if remaining <= 0:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Collection already completed')
+    return remaining
+
+
+def atomic_contribution_statement(
+    *,
+    wishlist: Wishlist,
+    item_id: uuid.UUID,
+    guest_session_id: uuid.UUID,
+    amount: Decimal,
+) -> Select:
+    """One PostgreSQL statement that locks the item, adds up to the remaining target and records the contribution.
+
+    Returns the updated item row plus an `accepted` column, or no row when the item cannot take contributions.
+    """
+    now = datetime.now(UTC)
+    target = func.coalesce(WishlistItem.target_amount, WishlistItem.price)
+    # FOR UPDATE returns the latest committed amount, so concurrent contributors never read a stale total
+    locked = (
+        select(WishlistItem.id, WishlistItem.collected_amount)
+        .where(WishlistItem.id == item_id, WishlistItem.wishlist_id == wishlist.id)
+        .with_for_update()
+        .cte('locked')
+    )
+    accepted = func.least(target - locked.c.collected_amount, amount)
+    updated = (
+        update(WishlistItem)
+        .where(
+            WishlistItem.id == locked.c.id,
+            WishlistItem.mode == ItemMode.GROUP,
+            WishlistItem.status == ItemStatus.ACTIVE,
+            target > locked.c.collected_amount,
+        )
+        .values(collected_amount=locked.c.collected_amount + accepted, updated_at=now)
+        .returning(*WishlistItem.__table__.c, accepted.label('accepted'))
+        .cte('updated')
+    )
+    inserted = insert(Contribution).from_select(
+        ['id', 'item_id', 'guest_session_id', 'amount', 'currency', 'created_at', 'updated_at'],
+        select(
+            literal(uuid.uuid4(), Contribution.id.type),
+            updated.c.id,
+            literal(guest_session_id, Contribution.guest_session_id.type),
+            updated.c.accepted,
+            literal(wishlist.currency, Contribution.currency.type),
+            literal(now, Contribution.created_at.type),
+            literal(now, Contribution.updated_at.type),
+        ),
+    ).cte('inserted')
+    return select(updated).add_cte(inserted)
+
+
+async def _contribute_atomic(
+    db: AsyncSession,
+    *,
+    wishlist: Wishlist,
+    item_id: uuid.UUID,
+    guest_session_id: uuid.UUID,
+    amount: Decimal,
+) -> tuple[WishlistItem, Decimal]:
+    statement = atomic_contribution_statement(wishlist=wishlist, item_id=item_id, guest_session_id=guest_session_id, amount=amount)
+    row = (await db.execute(statement)).one_or_none()
+    if row is None:
+        # nothing was updated; read the item once more to report why. The statement bypassed the session,
+        # so a copy of the item already in it may be stale
+        item = await get_public_item_or_404(db, wishlist.id, item_id, populate_existing=True)
+        _remaining_or_409(item)
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Item changed, please retry')
+
+    fields = dict(row._mapping)
+    accepted = fields.pop('accepted')
+    return WishlistItem(**fields), accepted
+
+
+async def _contribute_locked(
+    db: AsyncSession,
+    *,
+    wishlist: Wishlist,
+    item_id: uuid.UUID,
+    guest_session_id: uuid.UUID,
+    amount: Decimal,
+) -> tuple[WishlistItem, Decimal]:
+    item = await get_public_item_or_404(db, wishlist.id, item_id, for_update=True)
+    accepted = min(amount, _remaining_or_409(item))
+    if accepted <= 0:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Minimum contribution is 1')
+
+    db.add(Contribution(item_id=item.id, guest_session_id=guest_session_id, amount=accepted, currency=wishlist.currency))
+    item.collected_amount = (item.collected_amount or Decimal('0')) + accepted
+    return item, accepted
+
+
+async def add_group_contribution(
+    db: AsyncSession,
+    *,
+    wishlist: Wishlist,
+    item_id: uuid.UUID,
+    guest_session_id: uuid.UUID,
+    amount: Decimal,
+) -> tuple[WishlistItem, Decimal]:
+    """Adds up to `amount` to a group item without passing its target; returns the item and the accepted amount.
+
+    On PostgreSQL this is a single round trip; other databases lock the row and write it back.
+    """
+    contribute = _contribute_atomic if db.bind.dialect.name == 'postgresql' else _contribute_locked
+    return await contribute(db, wishlist=wishlist, item_id=item_id, guest_session_id=guest_session_id, amount=amount)
@@ -1,11 +1,25 @@
+from collections import Counter
+from datetime import UTC, datetime
 from typing import Any
 from uuid import UUID
 
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import event as sa_event
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session, SessionTransaction
 
-from app.models.enums import EventType
+from app.models.enums import EventType, ItemStatus
 from app.models.realtime_event import RealtimeEvent
-from app.realtime.manager import connection_manager
+from app.models.wishlist import Wishlist
+from app.realtime.frames import RESYNC_FRAME, Frame, event_message
+from app.realtime.manager import Subscriber, connection_manager, owner_channel
+from app.schemas.wishlist import PublicWishlistView
+from app.services.wishlist_service import build_guest_item_view, get_public_wishlist_or_404
+
+BUFFERED_EVENTS_KEY = 'realtime_buffered_events'
+PENDING_FRAMES_KEY = 'realtime_pending_frames'
+SAVEPOINT_MARKS_KEY = 'realtime_savepoint_marks'
+REPLAY_PAGE_SIZE = 100
 
 
 async def publish_event(
@@ -16,26 +30,207 @@ async def publish_event(
     event_type: EventType,
     payload: dict[str, Any],
     item_id: UUID | None = None,
-) -> RealtimeEvent:
-    event = RealtimeEvent(
-        wishlist_id=wishlist_id,
-        event_type=event_type,
-        item_id=item_id,
-        payload=payload,
-    )
-    db.add(event)
-    await db.flush()
-
-    if share_slug:
-        await connection_manager.broadcast(
+) -> None:
+    now = datetime.now(UTC)
+    db.info.setdefault(BUFFERED_EVENTS_KEY, []).append(
+        (
             share_slug,
             {
-                'id': event.id,
-                'event_type': event.event_type.value,
-                'item_id': str(item_id) if item_id else None,
+                'wishlist_id': wishlist_id,
+                'event_type': event_type,
+                'item_id': item_id,
                 'payload': payload,
-                'created_at': event.created_at.isoformat() if event.created_at else None,
+                'created_at': now,
+                'updated_at': now,
             },
         )
+    )
+
+
+async def load_events_after(
+    db: AsyncSession,
+    wishlist_id: UUID,
+    cursor: int | None,
+    limit: int,
+) -> list[RealtimeEvent]:
+    stmt = select(RealtimeEvent).where(RealtimeEvent.wishlist_id == wishlist_id)
+    if cursor is not None:
+        stmt = stmt.where(RealtimeEvent.id > cursor)
+    result = await db.execute(stmt.order_by(RealtimeEvent.id.asc()).limit(limit))
+    return list(result.scalars().all())
+
+
+async def latest_event_id(db: AsyncSession, wishlist_id: UUID) -> int | None:
+    result = await db.execute(select(func.max(RealtimeEvent.id)).where(RealtimeEvent.wishlist_id == wishlist_id))
+    return result.scalar_one()
+
+
+async def replay_events(
+    db: AsyncSession,
+    subscriber: Subscriber,
+    *,
+    wishlist_id: UUID,
+    share_slug: str,
+    cursor: int,
+    compacted_through: int | None = None,
+) -> None:
+    last_id = cursor
+    frames = connection_manager.replay_since(share_slug, cursor)
+    if frames is not None:
+        subscriber.replay(frames)
+        if frames:
+            last_id = frames[-1].message['id']
+    elif compacted_through is not None and cursor < compacted_through:
+        subscriber.send_control(RESYNC_FRAME)
+        subscriber.resume()
+        return
+    else:
+        while True:
+            events = await load_events_after(db, wishlist_id, last_id, REPLAY_PAGE_SIZE)
+            if events:
+                subscriber.replay([Frame(event_message(event)) for event in events])
+                last_id = events[-1].id
+            if len(events) < REPLAY_PAGE_SIZE:
+                break
+    subscriber.resume(after_id=last_id)
+
+
+async def _render_snapshot(session_factory: async_sessionmaker[AsyncSession], share_slug: str, version: int) -> Frame:
+    # items are read after the version, so they are at least that fresh; deltas carry full state
+    # and re-applying one the snapshot already reflects is harmless
+    async with session_factory() as db:
+        wishlist = await get_public_wishlist_or_404(db=db, slug=share_slug)
+        view = PublicWishlistView(
+            id=wishlist.id,
+            title=wishlist.title,
+            description=wishlist.description,
+            currency=wishlist.currency,
+            status=wishlist.status,
+            share_slug=share_slug,
+            version=version,
+            viewer_kind='anonymous',
+            items=[build_guest_item_view(item, None) for item in wishlist.items if item.status != ItemStatus.ARCHIVED],
+        )
+    return Frame({'type': 'snapshot', 'version': version, 'wishlist': view.model_dump(mode='json')})
+
+
+async def get_public_snapshot(db: AsyncSession, *, share_slug: str, version: int) -> Frame:
+    """Anonymous view of the wishlist at `version`, rendered once and shared with realtime snapshots.
+
+    Concurrent requests for the same version wait on a single query and render. Ends the transaction of `db`.
+    """
+    # the render runs in its own session so the requests sharing it do not depend on the one that
+    # started it; the caller's transaction ends first, otherwise a crowd of waiters would hold every
+    # pooled connection and the render could never get one
+    await db.commit()
+    return await connection_manager.snapshots.get(
+        share_slug,
+        version,
+        lambda: _render_snapshot(async_sessionmaker(db.bind, expire_on_commit=False), share_slug, version),
+    )
+
+
+async def send_snapshot(
+    session_factory: async_sessionmaker[AsyncSession],
+    subscriber: Subscriber,
+    *,
+    share_slug: str,
+    version: int,
+) -> None:
+    frame = await connection_manager.snapshots.get(
+        share_slug,
+        version,
+        lambda: _render_snapshot(session_factory, share_slug, version),
+    )
+    subscriber.replay([frame])
+    subscriber.resume(after_version=version)
+
+
+@sa_event.listens_for(Session, 'after_transaction_create')
+def _mark_savepoint(session: Session, transaction: SessionTransaction) -> None:
+    if transaction.nested:
+        # events buffered from here on belong to the savepoint and go away if it is rolled back
+        session.info.setdefault(SAVEPOINT_MARKS_KEY, {})[transaction] = len(session.info.get(BUFFERED_EVENTS_KEY, ()))
+
+
+@sa_event.listens_for(Session, 'before_commit')
+def _write_buffered_events(session: Session) -> None:
+    # releasing a savepoint keeps its events buffered until the real commit
+    savepoint = session.get_nested_transaction()
+    if savepoint is not None:
+        session.info.get(SAVEPOINT_MARKS_KEY, {}).pop(savepoint, None)
+        return
+    session.info.pop(SAVEPOINT_MARKS_KEY, None)
+    buffered = session.info.pop(BUFFERED_EVENTS_KEY, None)
+    if not buffered:
+        return
+
+    rows = [row for _, row in buffered]
+    owners = _assign_versions(session, rows)
+    result = session.execute(
+        insert(RealtimeEvent).returning(RealtimeEvent.id, sort_by_parameter_order=True),
+        rows,
+    )
+    event_ids = result.scalars().all()
+
+    frames = session.info.setdefault(PENDING_FRAMES_KEY, [])
+    for (share_slug, row), event_id in zip(buffered, event_ids, strict=True):
+        frame = Frame(
+            {
+                'id': event_id,
+                'event_type': row['event_type'].value,
+                'wishlist_id': str(row['wishlist_id']),
+                'item_id': str(row['item_id']) if row['item_id'] else None,
+                'payload': row['payload'],
+                'version': row['version'],
+                'created_at': row['created_at'].isoformat(),
+            }
+        )
+        if share_slug:
+            frames.append((share_slug, frame))
+        owner_id = owners.get(row['wishlist_id'])
+        if owner_id is not None:
+            frames.append((owner_channel(owner_id), frame))
+
+
+def _assign_versions(session: Session, rows: list[dict[str, Any]]) -> dict[UUID, UUID]:
+    counts = Counter(row['wishlist_id'] for row in rows)
+    next_versions: dict[UUID, int] = {}
+    owners: dict[UUID, UUID] = {}
+    for wishlist_id, count in counts.items():
+        result = session.execute(
+            update(Wishlist)
+            .where(Wishlist.id == wishlist_id)
+            .values(version=Wishlist.version + count)
+            .returning(Wishlist.version, Wishlist.owner_id)
+        )
+        updated = result.one_or_none()
+        latest = updated.version if updated else count
+        if updated:
+            owners[wishlist_id] = updated.owner_id
+        next_versions[wishlist_id] = latest - count + 1
+
+    for row in rows:
+        row['version'] = next_versions[row['wishlist_id']]
+        next_versions[row['wishlist_id']] += 1
+    return owners
+
+
+@sa_event.listens_for(Session, 'after_commit')
+def _deliver_pending_frames(session: Session) -> None:
+    if session.in_nested_transaction():
+        return
+    for channel, frame in session.info.pop(PENDING_FRAMES_KEY, []):
+        connection_manager.broadcast_nowait(channel, frame)
+
 
-    return event
+@sa_event.listens_for(Session, 'after_rollback')
+def _discard_pending_events(session: Session) -> None:
+    savepoint = session.get_nested_transaction()
+    if savepoint is not None:
+        mark = session.info.get(SAVEPOINT_MARKS_KEY, {}).pop(savepoint, 0)
+        del session.info.get(BUFFERED_EVENTS_KEY, [])[mark:]
+        return
+    session.info.pop(SAVEPOINT_MARKS_KEY, None)
+    session.info.pop(BUFFERED_EVENTS_KEY, None)
+    session.info.pop(PENDING_FRAMES_KEY, None)
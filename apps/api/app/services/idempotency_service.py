@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+from uuid import UUID
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.models.idempotency_key import IdempotencyKey
+
+REPLAYED_HEADER_NAME = 'Idempotent-Replayed'
+
+
+@dataclass(frozen=True, slots=True)
+class IdempotentRequest:
+    guest_session_id: UUID
+    key: str
+    fingerprint: str
+
+
+@dataclass(frozen=True, slots=True)
+class _RecordedResponse:
+    fingerprint: str
+    status_code: int
+    body: dict[str, Any]
+
+
+class _RecentResponses:
+    """Recorded responses this process has seen lately, so most retries skip the database."""
+
+    def __init__(self, max_size: int) -> None:
+        self._max_size = max_size
+        self._responses: OrderedDict[tuple[UUID, str], _RecordedResponse] = OrderedDict()
+
+    def get(self, key: tuple[UUID, str]) -> _RecordedResponse | None:
+        recorded = self._responses.get(key)
+        if recorded is not None:
+            self._responses.move_to_end(key)
+        return recorded
+
+    def put(self, key: tuple[UUID, str], recorded: _RecordedResponse) -> None:
+        if not self._max_size:
+            return
+        self._responses[key] = recorded
+        self._responses.move_to_end(key)
+        if len(self._responses) > self._max_size:
+            self._responses.popitem(last=False)
+
+    def clear(self) -> None:
+        self._responses.clear()
+
+
+recent_responses = _RecentResponses(get_settings().idempotency_cache_size)
+
+
+def idempotent_request(key: str | None, guest_session_id: UUID, *request_parts: str) -> IdempotentRequest | None:
+    """Identifies a keyed request; the parts describe the operation so a key reused for another one is rejected."""
+    if key is None:
+        return None
+    fingerprint = hashlib.sha256('\n'.join(request_parts).encode()).hexdigest()
+    return IdempotentRequest(guest_session_id=guest_session_id, key=key, fingerprint=fingerprint)
+
+
+def _replay(request: IdempotentRequest, recorded: _RecordedResponse) -> JSONResponse:
+    if recorded.fingerprint != request.fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail='Idempotency-Key was already used for a different request',
+        )
+    return JSONResponse(recorded.body, status_code=recorded.status_code, headers={REPLAYED_HEADER_NAME: 'true'})
+
+
+async def replay_recorded_response(db: AsyncSession, request: IdempotentRequest | None) -> JSONResponse | None:
+    """The response recorded for an earlier attempt of this request, if there was one."""
+    if request is None:
+        return None
+    cache_key = (request.guest_session_id, request.key)
+    recorded = recent_responses.get(cache_key)
+    if recorded is None:
+        row = await db.get(IdempotencyKey, cache_key)
+        if row is None:
+            return None
+        recorded = _RecordedResponse(fingerprint=row.fingerprint, status_code=row.status_code, body=row.response)
+        recent_responses.put(cache_key, recorded)
+    return _replay(request, recorded)
+
+
+async def commit_recording_response(
+    db: AsyncSession,
+    request: IdempotentRequest | None,
+    response: BaseModel,
+    status_code: int = status.HTTP_200_OK,
+) -> BaseModel | JSONResponse:
+    """Commits the mutation together with its response, so retries with the same key never apply it twice."""
+    if request is None:
+        await db.commit()
+        return response
+
+    recorded = _RecordedResponse(
+        fingerprint=request.fingerprint,
+        status_code=status_code,
+        body=response.model_dump(mode='json'),
+    )
+    db.add(
+        IdempotencyKey(
+            guest_session_id=request.guest_session_id,
+            key=request.key,
+            fingerprint=recorded.fingerprint,
+            status_code=recorded.status_code,
+            response=recorded.body,
+        )
+    )
+    try:
+        await db.commit()
+    except IntegrityError:
+        # a concurrent attempt with the same key committed first; this one is rolled back and answers like it
+        await db.rollback()
+        replayed = await replay_recorded_response(db, request)
+        if replayed is None:
+            raise
+        return replayed
+    recent_responses.put((request.guest_session_id, request.key), recorded)
+    return response
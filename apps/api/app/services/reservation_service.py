@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import uuid
+from datetime import UTC, datetime
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.reservation import Reservation
+
+
+async def reserve_item_for_guest(db: AsyncSession, *, item_id: uuid.UUID, guest_session_id: uuid.UUID) -> None:
+    """Claims the item for the guest in one upsert; raises 409 when another guest holds it.
+
+    Taking over a released reservation and re-reserving your own are both updates of the existing row.
+    """
+    now = datetime.now(UTC)
+    dialect_insert = postgresql.insert if db.bind.dialect.name == 'postgresql' else sqlite.insert
+    statement = dialect_insert(Reservation).values(
+        item_id=item_id,
+        guest_session_id=guest_session_id,
+        is_active=True,
+        reserved_at=now,
+        released_at=None,
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[Reservation.item_id],
+        set_={
+            'guest_session_id': statement.excluded.guest_session_id,
+            'is_active': True,
+            'reserved_at': statement.excluded.reserved_at,
+            'released_at': None,
+            'updated_at': now,
+        },
+        where=Reservation.is_active.is_(False) | (Reservation.guest_session_id == guest_session_id),
+    ).returning(Reservation.id)
+    if (await db.execute(statement)).scalar_one_or_none() is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Item is already reserved')
+
+
+async def release_guest_reservation(db: AsyncSession, *, item_id: uuid.UUID, guest_session_id: uuid.UUID) -> None:
+    """Releases the guest's active reservation of the item in one conditional update."""
+    result = await db.execute(
+        update(Reservation)
+        .where(
+            Reservation.item_id == item_id,
+            Reservation.is_active.is_(True),
+            Reservation.guest_session_id == guest_session_id,
+        )
+        .values(is_active=False, released_at=datetime.now(UTC))
+        .returning(Reservation.id)
+    )
+    if result.scalar_one_or_none() is not None:
+        return
+
+    # nothing was released; find out why
+    holder = await db.execute(
+        select(Reservation.guest_session_id).where(Reservation.item_id == item_id, Reservation.is_active.is_(True))
+    )
+    if holder.scalar_one_or_none() is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Reservation not found')
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='You can release only your reservation')
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import logging
+from datetime import UTC, datetime, timedelta
+from uuid import UUID
+
+from sqlalchemy import delete, func, or_, select, text, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.idempotency_key import IdempotencyKey
+from app.models.realtime_event import RealtimeEvent
+from app.models.wishlist import Wishlist
+
+logger = logging.getLogger(__name__)
+
+PARTITION_PREFIX = 'realtime_events_y'
+DEFAULT_PARTITION = 'realtime_events_default'
+
+
+async def _window_cutoffs(db: AsyncSession, keep: int) -> dict[UUID, int]:
+    crowded = await db.execute(
+        select(RealtimeEvent.wishlist_id).group_by(RealtimeEvent.wishlist_id).having(func.count(RealtimeEvent.id) > keep)
+    )
+    cutoffs: dict[UUID, int] = {}
+    for wishlist_id in crowded.scalars():
+        # newest event that falls out of the window; served by the (wishlist_id, id) index
+        result = await db.execute(
+            select(RealtimeEvent.id)
+            .where(RealtimeEvent.wishlist_id == wishlist_id)
+            .order_by(RealtimeEvent.id.desc())
+            .offset(keep)
+            .limit(1)
+        )
+        cutoffs[wishlist_id] = result.scalar_one()
+    return cutoffs
+
+
+async def _age_cutoffs(db: AsyncSession, older_than: datetime) -> dict[UUID, int]:
+    result = await db.execute(
+        select(RealtimeEvent.wishlist_id, func.max(RealtimeEvent.id))
+        .where(RealtimeEvent.created_at < older_than)
+        .group_by(RealtimeEvent.wishlist_id)
+    )
+    return {wishlist_id: event_id for wishlist_id, event_id in result.all()}
+
+
+async def compact_realtime_events(
+    db: AsyncSession,
+    *,
+    keep: int,
+    max_age_days: int = 0,
+    now: datetime | None = None,
+) -> int:
+    """Deletes events outside each wishlist's retention window and returns how many were removed.
+
+    A wishlist keeps its newest `keep` events, minus those older than `max_age_days` when set.
+    The id of the newest removed event is recorded on the wishlist, so older cursors get a resync
+    signal and load the current view instead of an incomplete history.
+    """
+    cutoffs = await _window_cutoffs(db, keep)
+    if max_age_days:
+        older_than = (now or datetime.now(UTC)) - timedelta(days=max_age_days)
+        for wishlist_id, event_id in (await _age_cutoffs(db, older_than)).items():
+            cutoffs[wishlist_id] = max(event_id, cutoffs.get(wishlist_id, event_id))
+
+    removed = 0
+    for wishlist_id, cutoff in cutoffs.items():
+        await db.execute(
+            update(Wishlist)
+            .where(
+                Wishlist.id == wishlist_id,
+                or_(Wishlist.events_compacted_through.is_(None), Wishlist.events_compacted_through < cutoff),
+            )
+            .values(events_compacted_through=cutoff)
+        )
+        result = await db.execute(
+            delete(RealtimeEvent).where(RealtimeEvent.wishlist_id == wishlist_id, RealtimeEvent.id <= cutoff)
+        )
+        removed += result.rowcount or 0
+    return removed
+
+
+async def purge_idempotency_keys(db: AsyncSession, *, older_than_hours: int, now: datetime | None = None) -> int:
+    """Deletes recorded idempotent responses past their retention; retries after that are treated as new requests."""
+    older_than = (now or datetime.now(UTC)) - timedelta(hours=older_than_hours)
+    result = await db.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < older_than))
+    return result.rowcount or 0
+
+
+def _month_start(moment: datetime) -> datetime:
+    return moment.astimezone(UTC).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month: datetime) -> datetime:
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def partition_name(month: datetime) -> str:
+    return f'{PARTITION_PREFIX}{month:%Y}m{month:%m}'
+
+
+async def events_are_partitioned(db: AsyncSession) -> bool:
+    if db.bind.dialect.name != 'postgresql':
+        return False
+    result = await db.execute(
+        text(
+            'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p '
+            "JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = 'realtime_events')"
+        )
+    )
+    return bool(result.scalar_one())
+
+
+async def _table_exists(db: AsyncSession, name: str) -> bool:
+    return (await db.execute(text('SELECT to_regclass(:name) IS NOT NULL'), {'name': name})).scalar_one()
+
+
+async def _create_partition(db: AsyncSession, month: datetime) -> None:
+    name = partition_name(month)
+    if await _table_exists(db, name):
+        return
+    lower, upper = month.isoformat(), _next_month(month).isoformat()
+    bounds = f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+    if not await _table_exists(db, DEFAULT_PARTITION):
+        await db.execute(text(f'CREATE TABLE {name} PARTITION OF realtime_events {bounds}'))
+        return
+
+    # a partition cannot be created while the default partition holds rows of its range, so those rows move
+    # into it first; inserts are held off until commit so none can land in the default partition meanwhile
+    await db.execute(text(f'LOCK TABLE {DEFAULT_PARTITION} IN ACCESS EXCLUSIVE MODE'))
+    await db.execute(text(f'CREATE TABLE {name} (LIKE realtime_events INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+    moved = await db.execute(
+        text(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= :lower AND created_at < :upper RETURNING *) '
+            f'INSERT INTO {name} SELECT * FROM moved'
+        ),
+        {'lower': month, 'upper': _next_month(month)},
+    )
+    await db.execute(text(f'ALTER TABLE realtime_events ATTACH PARTITION {name} {bounds}'))
+    if moved.rowcount:
+        logger.info('Moved %s realtime events from the default partition into %s', moved.rowcount, name)
+
+
+async def maintain_event_partitions(db: AsyncSession, *, months_ahead: int = 2, now: datetime | None = None) -> None:
+    """Creates the monthly partitions of the coming months and drops past ones left empty by compaction.
+
+    Each partition is created or dropped in its own savepoint, so one failure does not undo the others.
+    """
+    if not await events_are_partitioned(db):
+        return
+
+    current = _month_start(now or datetime.now(UTC))
+    month = current
+    for _ in range(months_ahead + 1):
+        try:
+            async with db.begin_nested():
+                await _create_partition(db, month)
+        except DBAPIError:
+            logger.exception('Could not create realtime event partition %s', partition_name(month))
+        month = _next_month(month)
+
+    partitions = await db.execute(
+        text(
+            'SELECT c.relname FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid '
+            "JOIN pg_class parent ON parent.oid = i.inhparent WHERE parent.relname = 'realtime_events'"
+        )
+    )
+    for name in partitions.scalars().all():
+        if not name.startswith(PARTITION_PREFIX) or name >= partition_name(current):
+            continue
+        try:
+            async with db.begin_nested():
+                is_empty = (await db.execute(text(f'SELECT NOT EXISTS (SELECT 1 FROM {name})'))).scalar_one()
+                if is_empty:
+                    logger.info('Dropping empty realtime event partition %s', name)
+                    await db.execute(text(f'DROP TABLE {name}'))
+        except DBAPIError:
+            logger.exception('Could not drop realtime event partition %s', name)
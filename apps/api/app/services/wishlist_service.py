@@ -13,6 +13,7 @@ from app.models.guest_session import GuestSession
 from app.models.reservation import Reservation
 from app.models.wishlist import Wishlist
 from app.models.wishlist_item import WishlistItem
+from app.schemas.wishlist import OwnerItemView
 
 
 def _to_decimal(value: Decimal | None) -> Decimal:
@@ -26,8 +27,7 @@ def calculate_progress(collected_amount: Decimal, target_amount: Decimal | None,
     return float(min((collected_amount / target) * 100, Decimal('100')))
 
 
-def build_owner_item_view(item: WishlistItem) -> dict:
-    reservation_active = bool(item.reservation and item.reservation.is_active)
+def _item_fields(item: WishlistItem) -> dict:
     return {
         'id': item.id,
         'title': item.title,
@@ -40,41 +40,46 @@ def build_owner_item_view(item: WishlistItem) -> dict:
         'collected_amount': item.collected_amount,
         'status': item.status,
         'position': item.position,
-        'is_reserved': reservation_active,
         'progress_percent': calculate_progress(item.collected_amount, item.target_amount, item.price),
     }
 
 
-def build_guest_item_view(item: WishlistItem, guest_session: GuestSession | None) -> dict:
+def build_owner_item_view(item: WishlistItem) -> dict:
+    reservation_active = bool(item.reservation and item.reservation.is_active)
+    return {**_item_fields(item), 'is_reserved': reservation_active}
+
+
+def build_item_state(item: WishlistItem, *, is_reserved: bool | None = None) -> dict:
+    view = build_owner_item_view(item) if is_reserved is None else {**_item_fields(item), 'is_reserved': is_reserved}
+    return OwnerItemView.model_validate(view).model_dump(mode='json')
+
+
+def build_guest_item_view(
+    item: WishlistItem,
+    guest_session: GuestSession | None,
+    my_contribution: Decimal = Decimal('0'),
+) -> dict:
     reserved_by_you = False
     if item.reservation and item.reservation.is_active and guest_session:
         reserved_by_you = item.reservation.guest_session_id == guest_session.id
 
-    my_contribution = Decimal('0')
-    if guest_session:
-        for contribution in item.contributions:
-            if contribution.guest_session_id == guest_session.id:
-                my_contribution += contribution.amount
-
     return {
-        'id': item.id,
-        'title': item.title,
-        'product_url': item.product_url,
-        'image_url': item.image_url,
-        'notes': item.notes,
-        'price': item.price,
-        'mode': item.mode,
-        'target_amount': item.target_amount,
-        'collected_amount': item.collected_amount,
-        'status': item.status,
-        'position': item.position,
+        **_item_fields(item),
         'is_reserved': bool(item.reservation and item.reservation.is_active),
         'reserved_by_you': reserved_by_you,
         'my_contribution': my_contribution,
-        'progress_percent': calculate_progress(item.collected_amount, item.target_amount, item.price),
     }
 
 
+async def get_guest_contribution_totals(db: AsyncSession, guest_session_id: UUID) -> dict[UUID, Decimal]:
+    result = await db.execute(
+        select(Contribution.item_id, func.sum(Contribution.amount))
+        .where(Contribution.guest_session_id == guest_session_id)
+        .group_by(Contribution.item_id)
+    )
+    return {item_id: _to_decimal(total) for item_id, total in result.all()}
+
+
 async def get_owner_wishlist_or_404(
     db: AsyncSession,
     wishlist_id: UUID,
@@ -100,12 +105,7 @@ async def get_owner_wishlist_or_404(
 async def get_public_wishlist_or_404(db: AsyncSession, slug: str) -> Wishlist:
     result = await db.execute(
         select(Wishlist)
-        .options(
-            selectinload(Wishlist.items)
-            .selectinload(WishlistItem.reservation),
-            selectinload(Wishlist.items)
-            .selectinload(WishlistItem.contributions),
-        )
+        .options(selectinload(Wishlist.items).selectinload(WishlistItem.reservation))
         .where(Wishlist.share_slug == slug)
     )
     wishlist = result.scalar_one_or_none()
@@ -119,6 +119,37 @@ async def get_public_wishlist_or_404(db: AsyncSession, slug: str) -> Wishlist:
     return wishlist
 
 
+async def get_published_wishlist_or_404(db: AsyncSession, slug: str) -> Wishlist:
+    result = await db.execute(select(Wishlist).where(Wishlist.share_slug == slug))
+    wishlist = result.scalar_one_or_none()
+    if not wishlist:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Public wishlist not found')
+
+    if wishlist.status.value not in {'published', 'closed'}:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Wishlist is not published yet')
+
+    return wishlist
+
+
+async def get_public_item_or_404(
+    db: AsyncSession,
+    wishlist_id: UUID,
+    item_id: UUID,
+    *,
+    for_update: bool = False,
+    populate_existing: bool = False,
+) -> WishlistItem:
+    stmt = select(WishlistItem).where(WishlistItem.id == item_id, WishlistItem.wishlist_id == wishlist_id)
+    if for_update:
+        stmt = stmt.with_for_update()
+    if populate_existing:
+        stmt = stmt.execution_options(populate_existing=True)
+    item = (await db.execute(stmt)).scalar_one_or_none()
+    if not item:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Item not found')
+    return item
+
+
 async def ensure_slug_unique(db: AsyncSession, slug: str) -> bool:
     result = await db.execute(select(func.count(Wishlist.id)).where(Wishlist.share_slug == slug))
     return result.scalar_one() == 0
@@ -129,15 +160,22 @@ async def get_item_for_update(
     wishlist_id: UUID,
     item_id: UUID,
 ) -> WishlistItem:
+    """Locks the item and its reservation and reloads both, including copies already in the session.
+
+    Contributions, reservations and owner edits all take the item lock first, so a state built from the
+    returned item stays current until commit and its event gets a later version than any change it includes.
+    """
     result = await db.execute(
         select(WishlistItem)
-        .options(selectinload(WishlistItem.reservation), selectinload(WishlistItem.contributions))
+        .options(selectinload(WishlistItem.reservation))
         .where(WishlistItem.id == item_id, WishlistItem.wishlist_id == wishlist_id)
         .with_for_update()
+        .execution_options(populate_existing=True)
     )
     item = result.scalar_one_or_none()
     if not item:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Item not found')
+    await db.execute(select(Reservation.id).where(Reservation.item_id == item.id).with_for_update())
     return item
 
 
@@ -0,0 +1,192 @@
+"""Contributions per second on a single hot group item, and a check that the target is never overshot.
+
+Every contributor runs in its own session and commits each contribution, competing for the same item. Each
+path runs at every contributor count, once calling the contribution service alone and once through
+`POST /public/w/{slug}/items/{id}/contributions`, which also publishes the event and so bumps the wishlist
+version row on every commit. Needs PostgreSQL; the tables are created if missing and the benchmark rows are
+removed afterwards.
+
+Run from apps/api: python -m benchmarks.contribution_throughput [--database-url ...] [--contributors 8,32]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+
+from fastapi import HTTPException
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.api.deps import get_db
+from app.core.config import get_settings
+from app.core.security import create_guest_token
+from app.db.base import Base
+from app.main import create_app
+from app.models.contribution import Contribution
+from app.models.enums import ItemMode, WishlistStatus
+from app.models.guest_session import GuestSession
+from app.models.user import User
+from app.models.wishlist import Wishlist
+from app.models.wishlist_item import WishlistItem
+from app.services.contribution_service import _contribute_atomic, _contribute_locked
+from app.services.wishlist_service import get_public_item_or_404
+
+Contribute = Callable[..., Awaitable[tuple[WishlistItem, Decimal]]]
+# contributes once as the given guest; False once the item takes no more
+Contributor = Callable[[uuid.UUID], Awaitable[bool]]
+
+
+async def _setup(
+    session_factory: async_sessionmaker[AsyncSession],
+    contributors: int,
+    target: Decimal,
+) -> tuple[Wishlist, uuid.UUID, list[uuid.UUID]]:
+    async with session_factory() as db:
+        owner = User(email=f'bench-{uuid.uuid4().hex}@example.com', display_name='Bench')
+        db.add(owner)
+        await db.flush()
+        wishlist = Wishlist(owner_id=owner.id, title='Office gift', status=WishlistStatus.PUBLISHED, share_slug=f'bench-{uuid.uuid4().hex}')
+        db.add(wishlist)
+        await db.flush()
+        item = WishlistItem(wishlist_id=wishlist.id, title='Espresso machine', mode=ItemMode.GROUP, target_amount=target)
+        db.add(item)
+        await db.flush()
+        guests = [
+            GuestSession(wishlist_id=wishlist.id, display_name=f'Colleague {index}', expires_at=datetime.now(UTC) + timedelta(days=1))
+            for index in range(contributors)
+        ]
+        db.add_all(guests)
+        await db.commit()
+        return wishlist, item.id, [guest.id for guest in guests]
+
+
+def _service_contributor(
+    session_factory: async_sessionmaker[AsyncSession],
+    contribute: Contribute,
+    wishlist: Wishlist,
+    item_id: uuid.UUID,
+    amount: Decimal,
+) -> Contributor:
+    async def contribute_once(guest_id: uuid.UUID) -> bool:
+        async with session_factory() as db:
+            try:
+                await contribute(db, wishlist=wishlist, item_id=item_id, guest_session_id=guest_id, amount=amount)
+            except HTTPException:
+                return False
+            await db.commit()
+        return True
+
+    return contribute_once
+
+
+def _route_contributor(client: AsyncClient, wishlist: Wishlist, item_id: uuid.UUID, amount: Decimal) -> Contributor:
+    settings = get_settings()
+    url = f'/api/v1/public/w/{wishlist.share_slug}/items/{item_id}/contributions'
+
+    async def contribute_once(guest_id: uuid.UUID) -> bool:
+        token = create_guest_token(str(guest_id), str(wishlist.id), settings.guest_token_ttl_days)
+        response = await client.post(url, headers={'X-Guest-Token': token}, json={'amount': str(amount)})
+        if response.status_code == 409:
+            return False
+        response.raise_for_status()
+        return True
+
+    return contribute_once
+
+
+async def _run(
+    session_factory: async_sessionmaker[AsyncSession],
+    client: AsyncClient,
+    contribute: Contribute | None,
+    *,
+    contributors: int,
+    per_contributor: int,
+    amount: Decimal,
+    target: Decimal,
+) -> tuple[float, Decimal, Decimal]:
+    wishlist, item_id, guest_ids = await _setup(session_factory, contributors, target)
+    if contribute is None:
+        contribute_once = _route_contributor(client, wishlist, item_id, amount)
+    else:
+        contribute_once = _service_contributor(session_factory, contribute, wishlist, item_id, amount)
+
+    async def contributor(guest_id: uuid.UUID) -> None:
+        for _ in range(per_contributor):
+            if not await contribute_once(guest_id):
+                return
+
+    started = time.perf_counter()
+    await asyncio.gather(*(contributor(guest_id) for guest_id in guest_ids))
+    elapsed = time.perf_counter() - started
+
+    async with session_factory() as db:
+        collected = (await get_public_item_or_404(db, wishlist.id, item_id)).collected_amount
+        contributed = (await db.execute(select(func.sum(Contribution.amount)).where(Contribution.item_id == item_id))).scalar_one()
+        count = (await db.execute(select(func.count(Contribution.id)).where(Contribution.item_id == item_id))).scalar_one()
+        await db.execute(delete(User).where(User.id == wishlist.owner_id))
+        await db.commit()
+    return count / elapsed, collected, contributed
+
+
+async def _main(database_url: str, contributor_counts: list[int], per_contributor: int) -> None:
+    engine = create_async_engine(database_url, pool_size=max(contributor_counts), max_overflow=0)
+    if engine.dialect.name != 'postgresql':
+        raise SystemExit('the atomic contribution path needs PostgreSQL')
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    app = create_app()
+    app.dependency_overrides[get_db] = override_get_db
+
+    # a None contribution function goes through the HTTP route, events included
+    paths: dict[str, Contribute | None] = {
+        'select for update': _contribute_locked,
+        'atomic statement': _contribute_atomic,
+        'route, atomic': None,
+    }
+    amount = Decimal('10.00')
+    print(f'{per_contributor} contributions of {amount} per contributor')
+    print(f'{"path":<20} {"contributors":>12} {"contrib/s":>10} {"target":>10} {"collected":>10} {"sum":>10} {"overshoot":>10}')
+    async with AsyncClient(transport=ASGITransport(app=app), base_url='http://bench') as client:
+        for contributors in contributor_counts:
+            # sized so the last contributions are clamped and the overshoot check is meaningful
+            target = amount * contributors * per_contributor - amount * 3 + Decimal('4.50')
+            for label, contribute in paths.items():
+                rate, collected, contributed = await _run(
+                    session_factory,
+                    client,
+                    contribute,
+                    contributors=contributors,
+                    per_contributor=per_contributor,
+                    amount=amount,
+                    target=target,
+                )
+                overshoot = max(collected - target, contributed - target, Decimal('0'))
+                print(f'{label:<20} {contributors:>12} {rate:>10.0f} {target:>10} {collected:>10} {contributed:>10} {overshoot:>10}')
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database-url', default=get_settings().database_url)
+    parser.add_argument('--contributors', default='4,16,64', help='comma-separated contributor counts')
+    parser.add_argument('--per-contributor', type=int, default=50)
+    args = parser.parse_args()
+    counts = [int(count) for count in args.contributors.split(',')]
+    asyncio.run(_main(args.database_url, counts, args.per_contributor))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Item queries per event when many anonymous viewers refetch a public wishlist at once.
+
+After every event, `--viewers` concurrent requests load `GET /public/w/{slug}`. The run is repeated with
+per-version request coalescing disabled, which is how every request used to render its own view.
+
+Run from apps/api: python -m benchmarks.public_view_single_flight [--viewers 200] [--events 10]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event as sa_event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.api.deps import get_db
+from app.db.base import Base
+from app.main import create_app
+from app.realtime.frames import Frame
+from app.realtime.manager import connection_manager
+from app.realtime.snapshots import SnapshotCache
+
+
+class _RenderEveryRequest(SnapshotCache):
+    async def get(self, channel: str, version: int, render: Callable[[], Awaitable[Frame]]) -> Frame:
+        return await render()
+
+
+async def _run(viewers: int, events: int, *, coalesce: bool) -> tuple[float, float]:
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(f'sqlite+aiosqlite:///{Path(directory) / "bench.db"}')
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+        async def override_get_db():
+            async with session_factory() as session:
+                yield session
+
+        app = create_app()
+        app.dependency_overrides[get_db] = override_get_db
+        connection_manager.snapshots = SnapshotCache(max_channels=16) if coalesce else _RenderEveryRequest(max_channels=16)
+
+        item_queries = 0
+        viewer_queries = 0
+
+        def record(conn, cursor, statement, parameters, context, executemany) -> None:
+            nonlocal item_queries
+            if 'FROM wishlist_items' in statement:
+                item_queries += 1
+
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url='http://bench') as owner, AsyncClient(
+            transport=transport, base_url='http://bench'
+        ) as viewer:
+            await owner.post(
+                '/api/v1/auth/register',
+                json={'email': 'owner@example.com', 'password': 'password123', 'display_name': 'Owner'},
+            )
+            wishlist_id = (await owner.post('/api/v1/wishlists', json={'title': 'Office party'})).json()['id']
+            for index in range(24):
+                await owner.post(
+                    f'/api/v1/wishlists/{wishlist_id}/items',
+                    json={'title': f'Gift #{index}', 'mode': 'group', 'target_amount': '10000.00'},
+                )
+            share_slug = (await owner.post(f'/api/v1/wishlists/{wishlist_id}/publish')).json()['share_slug']
+            url = f'/api/v1/public/w/{share_slug}'
+            item_ids = [item['id'] for item in (await viewer.get(url)).json()['items']]
+
+            sa_event.listen(engine.sync_engine, 'before_cursor_execute', record)
+            started = time.perf_counter()
+            for index in range(events):
+                await owner.patch(f'/api/v1/wishlists/{wishlist_id}/items/{item_ids[index % len(item_ids)]}', json={'notes': f'#{index}'})
+                # the owner's patch reloads the list itself; only count what the viewers caused
+                before = item_queries
+                responses = await asyncio.gather(*(viewer.get(url) for _ in range(viewers)))
+                assert all(response.status_code == 200 for response in responses)
+                viewer_queries += item_queries - before
+            elapsed = time.perf_counter() - started
+            sa_event.remove(engine.sync_engine, 'before_cursor_execute', record)
+
+        await engine.dispose()
+
+    return viewer_queries / events, elapsed / events * 1000
+
+
+async def _main(viewers: int, events: int) -> None:
+    print(f'{viewers} concurrent viewers, {events} events')
+    print(f'{"mode":<22} {"item queries/event":>19} {"ms/event":>9}')
+    for label, coalesce in (('render per request', False), ('coalesced by version', True)):
+        queries, millis = await _run(viewers, events, coalesce=coalesce)
+        print(f'{label:<22} {queries:>19.1f} {millis:>9.1f}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--viewers', type=int, default=200)
+    parser.add_argument('--events', type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(_main(args.viewers, args.events))
+
+
+if __name__ == '__main__':
+    main()
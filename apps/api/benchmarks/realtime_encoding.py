@@ -0,0 +1,109 @@
+"""Wire size and per-frame CPU of the realtime encodings, with and without permessage-deflate.
+
+Run from apps/api: python -m benchmarks.realtime_encoding [--frames 5000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+import zlib
+from collections.abc import Callable
+from datetime import UTC, datetime
+from uuid import uuid4
+
+from app.realtime.encoding import Encoding, available_encodings
+from app.realtime.frames import Frame
+
+DEFLATE_TAIL = b'\x00\x00\xff\xff'
+
+
+def _sample_messages(count: int) -> list[dict]:
+    wishlist_id = str(uuid4())
+    item_ids = [str(uuid4()) for _ in range(12)]
+    messages = []
+    for index in range(count):
+        item_id = item_ids[index % len(item_ids)]
+        collected = f'{(index * 250) % 10000}.00'
+        messages.append(
+            {
+                'id': 100_000 + index,
+                'event_type': 'contribution_added' if index % 3 else 'item_reserved',
+                'wishlist_id': wishlist_id,
+                'item_id': item_id,
+                'payload': {
+                    'item_id': item_id,
+                    'item': {
+                        'id': item_id,
+                        'title': f'Gift #{index % len(item_ids)}',
+                        'product_url': 'https://shop.example.com/products/123456',
+                        'image_url': None,
+                        'notes': None,
+                        'price': '10000.00',
+                        'mode': 'group',
+                        'target_amount': '10000.00',
+                        'collected_amount': collected,
+                        'status': 'active',
+                        'position': index % len(item_ids),
+                        'progress_percent': float(collected) / 100,
+                        'is_reserved': False,
+                    },
+                },
+                'version': index + 1,
+                'created_at': datetime.now(UTC).isoformat(),
+            }
+        )
+    return messages
+
+
+def _deflater(context_takeover: bool) -> Callable[[bytes], bytes]:
+    shared = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+
+    def deflate(data: bytes) -> bytes:
+        compressor = shared if context_takeover else zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        compressed = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        return compressed[: -len(DEFLATE_TAIL)] if compressed.endswith(DEFLATE_TAIL) else compressed
+
+    return deflate
+
+
+def _run(messages: list[dict], encoding: Encoding, deflate: Callable[[bytes], bytes] | None) -> tuple[float, float, float]:
+    total_bytes = 0
+    encode_seconds = 0.0
+    deflate_seconds = 0.0
+    for message in messages:
+        started = time.perf_counter()
+        payload = Frame(message).encode(encoding)
+        data = payload.encode() if isinstance(payload, str) else payload
+        encode_seconds += time.perf_counter() - started
+        if deflate is not None:
+            started = time.perf_counter()
+            data = deflate(data)
+            deflate_seconds += time.perf_counter() - started
+        total_bytes += len(data)
+    count = len(messages)
+    return total_bytes / count, encode_seconds / count * 1e6, deflate_seconds / count * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--frames', type=int, default=5000)
+    args = parser.parse_args()
+
+    messages = _sample_messages(args.frames)
+    print(f'{"encoding":<10} {"deflate":<16} {"bytes/frame":>12} {"encode us":>10} {"deflate us":>11}')
+    for encoding in ('json', 'compact', 'msgpack'):
+        if encoding not in available_encodings():
+            print(f'{encoding:<10} (not installed)')
+            continue
+        for label, deflate in (
+            ('off', None),
+            ('no takeover', _deflater(context_takeover=False)),
+            ('context takeover', _deflater(context_takeover=True)),
+        ):
+            size, encode_us, deflate_us = _run(messages, encoding, deflate)
+            print(f'{encoding:<10} {label:<16} {size:>12.1f} {encode_us:>10.2f} {deflate_us:>11.2f}')
+
+
+if __name__ == '__main__':
+    main()
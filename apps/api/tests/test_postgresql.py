@@ -0,0 +1,216 @@
+"""Tests of the PostgreSQL-only paths; they run when TEST_POSTGRES_URL points at a scratch database."""
+
+import asyncio
+import os
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event as sa_event
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from app.db.base import Base
+from app.models.contribution import Contribution
+from app.models.enums import EventType, ItemMode, WishlistStatus
+from app.models.guest_session import GuestSession
+from app.models.realtime_event import RealtimeEvent
+from app.models.user import User
+from app.models.wishlist import Wishlist
+from app.models.wishlist_item import WishlistItem
+from app.api.routes import public as public_routes
+from app.api.routes.wishlists import archive_item, update_item
+from app.schemas.wishlist import WishlistItemUpdateRequest
+from app.services.contribution_service import add_group_contribution
+from app.services.retention_service import maintain_event_partitions
+from app.services.wishlist_service import get_owner_wishlist_or_404
+
+POSTGRES_URL = os.environ.get('TEST_POSTGRES_URL')
+
+pytestmark = [
+    pytest.mark.postgres,
+    pytest.mark.skipif(not POSTGRES_URL, reason='TEST_POSTGRES_URL is not set'),
+]
+
+
+@pytest.fixture
+async def engine():
+    engine = create_async_engine(POSTGRES_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def _partition_events(engine: AsyncEngine) -> None:
+    """Turns realtime_events into a range-partitioned table with only a default partition, as before any maintenance ran."""
+    async with engine.begin() as conn:
+        for statement in (
+            'ALTER SEQUENCE realtime_events_id_seq OWNED BY NONE',
+            'ALTER TABLE realtime_events RENAME TO realtime_events_plain',
+            'CREATE TABLE realtime_events (LIKE realtime_events_plain INCLUDING DEFAULTS, PRIMARY KEY (id, created_at)) '
+            'PARTITION BY RANGE (created_at)',
+            'DROP TABLE realtime_events_plain',
+            'ALTER SEQUENCE realtime_events_id_seq OWNED BY realtime_events.id',
+            'CREATE TABLE realtime_events_default PARTITION OF realtime_events DEFAULT',
+        ):
+            await conn.exec_driver_sql(statement)
+
+
+async def _published_wishlist(db: AsyncSession) -> Wishlist:
+    wishlist = Wishlist(
+        owner=User(email='owner@example.com', display_name='Owner'),
+        title='Birthday',
+        status=WishlistStatus.PUBLISHED,
+        share_slug='birthday',
+    )
+    db.add(wishlist)
+    await db.flush()
+    return wishlist
+
+
+async def _contribution_setup(db: AsyncSession) -> tuple[Wishlist, WishlistItem, WishlistItem, GuestSession]:
+    wishlist = await _published_wishlist(db)
+    group = WishlistItem(wishlist_id=wishlist.id, title='Headphones', mode=ItemMode.GROUP, target_amount=Decimal('1000.00'))
+    single = WishlistItem(wishlist_id=wishlist.id, title='Book', mode=ItemMode.SINGLE, price=Decimal('500.00'))
+    guest = GuestSession(wishlist_id=wishlist.id, display_name='Friend', expires_at=datetime.now(UTC) + timedelta(days=1))
+    db.add_all([group, single, guest])
+    await db.commit()
+    return wishlist, group, single, guest
+
+
+async def _contribute(db: AsyncSession, wishlist: Wishlist, item: WishlistItem, guest: GuestSession, amount: str) -> Decimal:
+    _, accepted = await add_group_contribution(
+        db, wishlist=wishlist, item_id=item.id, guest_session_id=guest.id, amount=Decimal(amount)
+    )
+    await db.commit()
+    return accepted
+
+
+@pytest.mark.asyncio
+async def test_partition_maintenance_moves_rows_out_of_the_default_partition(engine, session_factory) -> None:
+    await _partition_events(engine)
+    now = datetime(2026, 10, 17, 12, tzinfo=UTC)
+    async with session_factory() as db:
+        wishlist = await _published_wishlist(db)
+        db.add_all(
+            RealtimeEvent(wishlist_id=wishlist.id, event_type=EventType.ITEM_UPDATED, payload={}, version=version, created_at=created_at)
+            for version, created_at in enumerate((now - timedelta(days=40), now - timedelta(days=2), now), start=1)
+        )
+        await db.commit()
+
+        # the default partition already holds rows of this month, which a plain CREATE ... PARTITION OF rejects
+        for _ in range(2):
+            await maintain_event_partitions(db, now=now)
+            await db.commit()
+
+        placement = await db.execute(text('SELECT tableoid::regclass::text, count(*) FROM realtime_events GROUP BY 1'))
+        partitions = await db.execute(
+            text("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = 'realtime_events'::regclass")
+        )
+    assert dict(placement.all()) == {'realtime_events_default': 1, 'realtime_events_y2026m10': 2}
+    assert sorted(partitions.scalars()) == [
+        'realtime_events_default',
+        'realtime_events_y2026m10',
+        'realtime_events_y2026m11',
+        'realtime_events_y2026m12',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_atomic_contribution_runs_as_one_statement_and_rejects_overfunding(engine, session_factory) -> None:
+    async with session_factory() as db:
+        wishlist, group, single, guest = await _contribution_setup(db)
+
+        statements: list[str] = []
+
+        def record(conn, cursor, statement, parameters, context, executemany) -> None:
+            statements.append(statement)
+
+        sa_event.listen(engine.sync_engine, 'before_cursor_execute', record)
+        try:
+            first = await _contribute(db, wishlist, group, guest, '600.00')
+        finally:
+            sa_event.remove(engine.sync_engine, 'before_cursor_execute', record)
+        assert len(statements) == 1
+        assert statements[0].lstrip().startswith('WITH locked AS')
+
+        # only what is left of the target is accepted, then the item refuses more
+        assert (first, await _contribute(db, wishlist, group, guest, '600.00')) == (Decimal('600.00'), Decimal('400.00'))
+        with pytest.raises(HTTPException) as completed:
+            await _contribute(db, wishlist, group, guest, '1.00')
+        assert (completed.value.status_code, completed.value.detail) == (409, 'Collection already completed')
+        with pytest.raises(HTTPException) as single_item:
+            await _contribute(db, wishlist, single, guest, '1.00')
+        assert (single_item.value.status_code, single_item.value.detail) == (409, 'Only contributions are allowed for this item')
+
+        amounts = (await db.execute(select(Contribution.amount).order_by(Contribution.amount))).scalars().all()
+        collected = (await db.execute(select(WishlistItem.collected_amount).where(WishlistItem.id == group.id))).scalar_one()
+    assert amounts == [Decimal('400.00'), Decimal('600.00')]
+    assert collected == Decimal('1000.00')
+
+
+@pytest.mark.asyncio
+async def test_concurrent_atomic_contributions_stop_exactly_at_the_target(session_factory) -> None:
+    async with session_factory() as db:
+        wishlist, group, _, guest = await _contribution_setup(db)
+
+    async def contribute() -> Decimal:
+        async with session_factory() as db:
+            try:
+                return await _contribute(db, wishlist, group, guest, '150.00')
+            except HTTPException as exc:
+                assert exc.detail == 'Collection already completed'
+                return Decimal('0')
+
+    accepted = await asyncio.gather(*(contribute() for _ in range(12)))
+
+    async with session_factory() as db:
+        contributed = (await db.execute(select(func.sum(Contribution.amount)))).scalar_one()
+        collected = (await db.execute(select(WishlistItem.collected_amount).where(WishlistItem.id == group.id))).scalar_one()
+    assert sorted(accepted, reverse=True)[:7] == [Decimal('150.00')] * 6 + [Decimal('100.00')]
+    assert sum(accepted) == contributed == collected == Decimal('1000.00')
+
+
+OWNER_EDITS = [
+    pytest.param(
+        lambda db, owner, item: update_item(item.wishlist_id, item.id, WishlistItemUpdateRequest(title='Earbuds'), db, owner),
+        id='update',
+    ),
+    pytest.param(lambda db, owner, item: archive_item(item.wishlist_id, item.id, db, owner), id='archive'),
+]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('edit', OWNER_EDITS)
+async def test_owner_edits_publish_contributions_that_interleave_with_them(session_factory, edit) -> None:
+    async with session_factory() as db:
+        wishlist, group, _, guest = await _contribution_setup(db)
+        owner = await db.get(User, wishlist.owner_id)
+
+    async with session_factory() as owner_db, session_factory() as guest_db:
+        # the owner's session already holds the item when a contribution commits
+        await get_owner_wishlist_or_404(owner_db, wishlist.id, owner.id)
+        await public_routes._contribute(guest_db, wishlist, group.id, guest.id, Decimal('300.00'))
+        await guest_db.commit()
+
+        # a contribution still in flight holds the item, so the owner's edit waits for it
+        await public_routes._contribute(guest_db, wishlist, group.id, guest.id, Decimal('200.00'))
+        editing = asyncio.create_task(edit(owner_db, owner, group))
+        await asyncio.sleep(0.2)
+        assert not editing.done()
+        await guest_db.commit()
+        await editing
+
+    async with session_factory() as db:
+        events = (await db.execute(select(RealtimeEvent).order_by(RealtimeEvent.version))).scalars().all()
+    assert [event.payload['item']['collected_amount'] for event in events] == ['300.00', '500.00', '500.00']
@@ -0,0 +1,708 @@
+import asyncio
+import uuid
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+from typing import Any
+
+import orjson
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event as sa_event
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.api.deps import get_db
+from app.api.routes import ws as ws_routes
+from app.api.routes.ws import _handle_command, wishlist_events_ws
+from app.db.base import Base
+from app.jobs import compact_events
+from app.main import create_app
+from app.models.contribution import Contribution
+from app.models.idempotency_key import IdempotencyKey
+from app.models.reservation import Reservation
+from app.models.wishlist import Wishlist
+from app.realtime.frames import Frame
+from app.realtime.manager import ConnectionManager, connection_manager
+from app.services.contribution_service import atomic_contribution_statement
+from app.services.event_service import send_snapshot
+from app.services.idempotency_service import recent_responses
+from app.services.retention_service import compact_realtime_events, purge_idempotency_keys
+from app.services.wishlist_service import get_published_wishlist_or_404
+
+
+async def _take(frames: AsyncIterator[Frame], count: int) -> AsyncIterator[Frame]:
+    async with asyncio.timeout(1):
+        for _ in range(count):
+            yield await anext(frames)
+
+
+@contextmanager
+def _recorded_statements(app) -> Iterator[list[str]]:
+    statements: list[str] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany) -> None:
+        statements.append(statement)
+
+    engine = app.state.session_factory.kw['bind'].sync_engine
+    sa_event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        sa_event.remove(engine, 'before_cursor_execute', record)
+
+
+@asynccontextmanager
+async def _open_stream(app, url: str, headers: dict[str, str] | None = None) -> AsyncIterator[asyncio.Queue[dict]]:
+    """Runs one GET through the ASGI app and hands over every message it sends; the client disconnects on exit.
+
+    httpx's ASGITransport buffers the body until the app returns, so it cannot read an open event stream.
+    """
+    path, _, query = url.partition('?')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 50000),
+    }
+    sent: asyncio.Queue[dict] = asyncio.Queue()
+    disconnected = asyncio.Event()
+    requested = False
+
+    async def receive() -> dict:
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    running = asyncio.create_task(app(scope, receive, sent.put))
+    try:
+        yield sent
+    finally:
+        disconnected.set()
+        async with asyncio.timeout(1):
+            await running
+
+
+async def _sse_events(sent: asyncio.Queue[dict], count: int) -> list[tuple[str, dict]]:
+    events: list[tuple[str, dict]] = []
+    async with asyncio.timeout(1):
+        while len(events) < count:
+            body = (await sent.get()).get('body', b'').decode()
+            fields = dict(line.split(': ', 1) for line in body.splitlines() if line)
+            if 'data' in fields:
+                events.append((fields['id'], orjson.loads(fields['data'])))
+    return events
+
+
+class RecordingWebSocket:
+    def __init__(self) -> None:
+        self.scope: dict[str, Any] = {}
+        self.sent: list[Any] = []
+
+    async def accept(self, subprotocol: str | None = None) -> None:
+        pass
+
+    async def send_text(self, text: str) -> None:
+        self.sent.append(orjson.loads(text))
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+
+@pytest.fixture
+async def app():
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:', future=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    fastapi_app = create_app()
+    fastapi_app.dependency_overrides[get_db] = override_get_db
+    fastapi_app.state.session_factory = session_factory
+
+    yield fastapi_app
+
+    await engine.dispose()
+
+
+@pytest.fixture
+async def client(app):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url='http://testserver') as test_client:
+        yield test_client
+
+
+@pytest.fixture
+async def published(client: AsyncClient, app) -> dict:
+    await client.post(
+        '/api/v1/auth/register',
+        json={'email': 'owner@example.com', 'password': 'password123', 'display_name': 'Owner Name'},
+    )
+    wishlist_id = (await client.post('/api/v1/wishlists', json={'title': 'Birthday 2026'})).json()['id']
+    await client.post(f'/api/v1/wishlists/{wishlist_id}/items', json={'title': 'Book', 'mode': 'single', 'price': '1500.00'})
+    await client.post(
+        f'/api/v1/wishlists/{wishlist_id}/items',
+        json={'title': 'Headphones', 'mode': 'group', 'target_amount': '10000.00'},
+    )
+    share_slug = (await client.post(f'/api/v1/wishlists/{wishlist_id}/publish')).json()['share_slug']
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url='http://testserver') as guest_client:
+        token = (
+            await guest_client.post(f'/api/v1/public/w/{share_slug}/guest-session', json={'name': 'Friend'})
+        ).json()['token']
+        items = (await guest_client.get(f'/api/v1/public/w/{share_slug}')).json()['items']
+
+    return {
+        'wishlist_id': wishlist_id,
+        'share_slug': share_slug,
+        'guest_headers': {'X-Guest-Token': token},
+        'single_item_id': next(item['id'] for item in items if item['mode'] == 'single'),
+        'group_item_id': next(item['id'] for item in items if item['mode'] == 'group'),
+    }
+
+
+@pytest.mark.asyncio
+async def test_events_long_poll_returns_when_an_event_is_published(client: AsyncClient, published: dict) -> None:
+    share_slug = published['share_slug']
+    cursor = (await client.get(f'/api/v1/public/w/{share_slug}/events')).json()['next_cursor']
+
+    poll = asyncio.create_task(client.get(f'/api/v1/public/w/{share_slug}/events', params={'cursor': cursor, 'wait': 5}))
+    await asyncio.sleep(0.05)
+    assert not poll.done()
+
+    reserve_response = await client.post(
+        f"/api/v1/public/w/{share_slug}/items/{published['single_item_id']}/reserve",
+        headers=published['guest_headers'],
+    )
+    assert reserve_response.status_code == 200
+
+    response = await asyncio.wait_for(poll, timeout=2)
+    assert response.status_code == 200
+    events = response.json()['events']
+    assert [event['event_type'] for event in events] == ['item_reserved']
+    assert response.json()['next_cursor'] == events[-1]['id']
+
+
+@pytest.mark.asyncio
+async def test_events_long_poll_times_out_with_unchanged_cursor(client: AsyncClient, published: dict) -> None:
+    share_slug = published['share_slug']
+    cursor = (await client.get(f'/api/v1/public/w/{share_slug}/events')).json()['next_cursor']
+
+    response = await client.get(f'/api/v1/public/w/{share_slug}/events', params={'cursor': cursor, 'wait': 0.1})
+
+    assert response.status_code == 200
+    assert response.json() == {'events': [], 'next_cursor': cursor, 'resync': False}
+
+
+@pytest.mark.asyncio
+async def test_events_carry_item_state_and_consecutive_versions(client: AsyncClient, published: dict) -> None:
+    share_slug = published['share_slug']
+    before = (await client.get(f'/api/v1/public/w/{share_slug}')).json()
+    cursor = (await client.get(f'/api/v1/public/w/{share_slug}/events')).json()['next_cursor']
+
+    await client.post(
+        f"/api/v1/public/w/{share_slug}/items/{published['group_item_id']}/contributions",
+        headers=published['guest_headers'],
+        json={'amount': '2500.00'},
+    )
+    await client.post(
+        f"/api/v1/public/w/{share_slug}/items/{published['single_item_id']}/reserve",
+        headers=published['guest_headers'],
+    )
+
+    events = (await client.get(f'/api/v1/public/w/{share_slug}/events', params={'cursor': cursor})).json()['events']
+    after = (await client.get(f'/api/v1/public/w/{share_slug}')).json()
+
+    assert [event['version'] for event in events] == [before['version'] + 1, before['version'] + 2]
+    assert after['version'] == events[-1]['version']
+
+    contribution_item = events[0]['payload']['item']
+    assert contribution_item['id'] == published['group_item_id']
+    assert contribution_item['collected_amount'] == '2500.00'
+    assert contribution_item['progress_percent'] == 25.0
+
+    reserved_item = events[1]['payload']['item']
+    public_item = next(item for item in after['items'] if item['id'] == published['single_item_id'])
+    assert reserved_item['is_reserved'] is True
+    assert reserved_item == {key: value for key, value in public_item.items() if key not in {'reserved_by_you', 'my_contribution'}}
+
+
+@pytest.mark.asyncio
+async def test_snapshot_frame_matches_public_view_and_skips_older_deltas(app, published: dict) -> None:
+    share_slug = published['share_slug']
+    async with AsyncClient(transport=ASGITransport(app=app), base_url='http://testserver') as anonymous_client:
+        public_view = (await anonymous_client.get(f'/api/v1/public/w/{share_slug}')).json()
+    version = public_view['version']
+
+    subscriber = connection_manager.subscribe(share_slug, paused=True)
+    try:
+        connection_manager.broadcast_nowait(share_slug, Frame({'id': 900, 'version': version}))
+        connection_manager.broadcast_nowait(share_slug, Frame({'id': 901, 'version': version + 1}))
+        await send_snapshot(app.state.session_factory, subscriber, share_slug=share_slug, version=version)
+        again = await connection_manager.snapshots.get(share_slug, version, lambda: pytest.fail('rendered twice'))
+
+        frames = subscriber.frames()
+        snapshot = await anext(frames)
+        assert snapshot is again
+        assert snapshot.message == {'type': 'snapshot', 'version': version, 'wishlist': public_view}
+        assert (await anext(frames)).message['id'] == 901
+    finally:
+        connection_manager.disconnect(share_slug, subscriber)
+
+
+@pytest.mark.asyncio
+async def test_multiplexed_socket_routes_many_channels_over_one_connection(client: AsyncClient, app, published: dict) -> None:
+    share_slug = published['share_slug']
+    session_factory = app.state.session_factory
+    async with session_factory() as db:
+        owner_id = (await get_published_wishlist_or_404(db, share_slug)).owner_id
+
+    websocket = RecordingWebSocket()
+    mux = await connection_manager.connect_multiplexed(websocket)
+    try:
+        for command in (
+            {'action': 'subscribe', 'channel': share_slug},
+            {'action': 'subscribe', 'channel': 'owner'},
+            {'action': 'subscribe', 'channel': 'missing-slug'},
+            {'action': 'publish'},
+        ):
+            await _handle_command(mux, orjson.dumps(command).decode(), user_id=owner_id, session_factory=session_factory)
+
+        await client.post(
+            f"/api/v1/public/w/{share_slug}/items/{published['single_item_id']}/reserve",
+            headers=published['guest_headers'],
+        )
+        for _ in range(10):
+            await asyncio.sleep(0)
+
+        replies = [message for message in websocket.sent if 'type' in message]
+        assert [(reply['type'], reply['channel']) for reply in replies] == [
+            ('subscribed', share_slug),
+            ('subscribed', 'owner'),
+            ('error', 'missing-slug'),
+            ('error', None),
+        ]
+
+        routed = [message for message in websocket.sent if 'event' in message]
+        assert sorted(message['channel'] for message in routed) == sorted([share_slug, 'owner'])
+        assert routed[0]['event'] == routed[1]['event']
+        assert routed[0]['event']['event_type'] == 'item_reserved'
+        assert routed[0]['event']['wishlist_id'] == published['wishlist_id']
+    finally:
+        mux.close()
+
+    assert connection_manager.connection_count == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_websocket_catch_up_releases_the_connection_slot(app, published: dict, monkeypatch: pytest.MonkeyPatch) -> None:
+    async def failing_replay(*args, **kwargs) -> None:
+        raise ConnectionError('database went away')
+
+    monkeypatch.setattr(ws_routes, 'SessionLocal', app.state.session_factory)
+    monkeypatch.setattr(ws_routes, 'replay_events', failing_replay)
+    with pytest.raises(ConnectionError):
+        await wishlist_events_ws(RecordingWebSocket(), published['share_slug'], cursor=0, snapshot=False, encoding=None)
+
+    assert connection_manager.connection_count == 0
+
+
+@pytest.mark.asyncio
+async def test_multiplexed_owner_channel_requires_authentication(app) -> None:
+    websocket = RecordingWebSocket()
+    mux = await connection_manager.connect_multiplexed(websocket)
+    try:
+        await _handle_command(
+            mux,
+            '{"action": "subscribe", "channel": "owner"}',
+            user_id=None,
+            session_factory=app.state.session_factory,
+        )
+        for _ in range(5):
+            await asyncio.sleep(0)
+    finally:
+        mux.close()
+
+    assert websocket.sent == [{'type': 'error', 'channel': 'owner', 'detail': 'Authentication required'}]
+
+
+@pytest.mark.asyncio
+async def test_multiplexed_socket_caps_its_subscriptions(app, published: dict) -> None:
+    share_slug = published['share_slug']
+    session_factory = app.state.session_factory
+    async with session_factory() as db:
+        owner_id = (await get_published_wishlist_or_404(db, share_slug)).owner_id
+
+    manager = ConnectionManager(max_subscriptions_per_socket=1)
+    websocket = RecordingWebSocket()
+    mux = await manager.connect_multiplexed(websocket)
+    try:
+        for command in (
+            {'action': 'subscribe', 'channel': share_slug},
+            {'action': 'subscribe', 'channel': 'owner'},
+            {'action': 'unsubscribe', 'channel': share_slug},
+            {'action': 'subscribe', 'channel': 'owner'},
+        ):
+            await _handle_command(mux, orjson.dumps(command).decode(), user_id=owner_id, session_factory=session_factory)
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert manager.connection_count == 1
+    finally:
+        mux.close()
+
+    assert [(reply['type'], reply['channel'], reply.get('detail')) for reply in websocket.sent] == [
+        ('subscribed', share_slug, None),
+        ('error', 'owner', 'Too many subscriptions on this socket'),
+        ('unsubscribed', share_slug, None),
+        ('subscribed', 'owner', None),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_sse_resumes_after_last_event_id_then_streams_live_events(client: AsyncClient, app, published: dict) -> None:
+    share_slug = published['share_slug']
+    item_url = f"/api/v1/public/w/{share_slug}/items/{published['single_item_id']}/reserve"
+    events_url = f'/api/v1/public/w/{share_slug}/events'
+    cursor = (await client.get(events_url)).json()['next_cursor']
+    await client.post(item_url, headers=published['guest_headers'])
+    await client.delete(item_url, headers=published['guest_headers'])
+    missed = (await client.get(events_url, params={'cursor': cursor})).json()['events']
+
+    # the browser's Last-Event-ID wins over the cursor the page was first opened with
+    url = f'/api/v1/sse/public/w/{share_slug}?cursor=0'
+    async with _open_stream(app, url, {'Last-Event-ID': str(missed[0]['id'])}) as sent:
+        start = await sent.get()
+        assert start['status'] == 200
+        assert (b'content-type', b'text/event-stream; charset=utf-8') in start['headers']
+        assert (await sent.get())['body'] == b'retry: 2000\n\n'
+
+        await client.post(item_url, headers=published['guest_headers'])
+        events = await _sse_events(sent, 2)
+        assert connection_manager.connection_count == 1
+
+    assert [event['event_type'] for _, event in events] == ['item_unreserved', 'item_reserved']
+    assert events[0][1]['id'] == missed[1]['id']
+    assert [int(event_id) for event_id, _ in events] == [event['id'] for _, event in events]
+    assert events[1][1]['id'] > events[0][1]['id']
+    assert connection_manager.connection_count == 0
+
+
+@pytest.mark.asyncio
+async def test_sse_turns_viewers_away_past_the_cap(client: AsyncClient, published: dict, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(connection_manager, 'has_capacity', lambda channel: False)
+
+    response = await client.get(f"/api/v1/sse/public/w/{published['share_slug']}")
+
+    assert (response.status_code, response.json()['detail']) == (503, 'Too many viewers, try again later')
+    assert response.headers['Retry-After'] == '2'
+    assert connection_manager.connection_count == 0
+
+
+@pytest.mark.asyncio
+async def test_compaction_keeps_a_window_and_asks_stale_cursors_to_resync(client: AsyncClient, app, published: dict) -> None:
+    share_slug = published['share_slug']
+    for action in ('reserve', 'unreserve', 'reserve'):
+        await client.post(
+            f"/api/v1/public/w/{share_slug}/items/{published['single_item_id']}/{action}",
+            headers=published['guest_headers'],
+        )
+    all_events = (await client.get(f'/api/v1/public/w/{share_slug}/events', params={'limit': 200})).json()['events']
+
+    async with app.state.session_factory() as db:
+        removed = await compact_realtime_events(db, keep=2)
+        await db.commit()
+
+    assert removed == len(all_events) - 2
+    kept = (await client.get(f'/api/v1/public/w/{share_slug}/events')).json()['events']
+    assert [event['id'] for event in kept] == [event['id'] for event in all_events[-2:]]
+
+    stale = (await client.get(f'/api/v1/public/w/{share_slug}/events', params={'cursor': 0})).json()
+    assert stale == {'events': [], 'next_cursor': all_events[-1]['id'], 'resync': True}
+
+    boundary = (await client.get(f'/api/v1/public/w/{share_slug}/events', params={'cursor': all_events[-3]['id']})).json()
+    assert boundary['resync'] is False
+    assert [event['id'] for event in boundary['events']] == [event['id'] for event in all_events[-2:]]
+
+
+@pytest.mark.asyncio
+async def test_retention_job_runs_each_step_in_its_own_transaction(
+    client: AsyncClient,
+    app,
+    published: dict,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    url = f"/api/v1/public/w/{published['share_slug']}/items/{published['single_item_id']}/reserve"
+    await client.post(url, headers={**published['guest_headers'], 'Idempotency-Key': 'reserve-1'})
+    async with app.state.session_factory() as db:
+        await db.execute(update(IdempotencyKey).values(created_at=datetime.now(UTC) - timedelta(days=2)))
+        await db.commit()
+
+    async def broken_partitions(db) -> None:
+        await db.execute(update(Wishlist).values(title='Half done'))
+        raise ConnectionError('partition maintenance failed')
+
+    monkeypatch.setattr(compact_events, 'SessionLocal', app.state.session_factory)
+    monkeypatch.setattr(compact_events, 'maintain_event_partitions', broken_partitions)
+    assert await compact_events.run() is False
+
+    async with app.state.session_factory() as db:
+        assert (await db.execute(select(func.count()).select_from(IdempotencyKey))).scalar_one() == 0
+        assert (await db.execute(select(Wishlist.title))).scalar_one() == 'Birthday 2026'
+
+
+@pytest.mark.asyncio
+async def test_guest_mutations_do_not_load_the_wishlist_graph(client: AsyncClient, app, published: dict) -> None:
+    share_slug = published['share_slug']
+    with _recorded_statements(app) as statements:
+        await client.post(
+            f"/api/v1/public/w/{share_slug}/items/{published['single_item_id']}/reserve",
+            headers=published['guest_headers'],
+        )
+        await client.post(
+            f"/api/v1/public/w/{share_slug}/items/{published['group_item_id']}/contributions",
+            headers=published['guest_headers'],
+            json={'amount': '100.00'},
+        )
+
+    selects = [statement for statement in statements if statement.lstrip().upper().startswith('SELECT')]
+    assert not any('FROM contributions' in statement for statement in selects)
+    item_selects = [statement for statement in selects if 'FROM wishlist_items' in statement]
+    assert item_selects
+    assert all('wishlist_items.id = ' in statement for statement in item_selects)
+
+
+@pytest.mark.asyncio
+async def test_public_view_sums_guest_contributions_in_sql(client: AsyncClient, app, published: dict) -> None:
+    share_slug = published['share_slug']
+    for amount in ('100.00', '250.50'):
+        await client.post(
+            f"/api/v1/public/w/{share_slug}/items/{published['group_item_id']}/contributions",
+            headers=published['guest_headers'],
+            json={'amount': amount},
+        )
+
+    with _recorded_statements(app) as statements:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url='http://testserver') as guest_client:
+            view = (await guest_client.get(f'/api/v1/public/w/{share_slug}', headers=published['guest_headers'])).json()
+
+    totals = {item['id']: item['my_contribution'] for item in view['items']}
+    assert totals == {published['group_item_id']: '350.50', published['single_item_id']: '0'}
+    contribution_reads = [statement for statement in statements if 'FROM contributions' in statement]
+    assert len(contribution_reads) == 1
+    assert 'sum(contributions.amount)' in contribution_reads[0]
+
+
+@pytest.mark.asyncio
+async def test_public_view_revalidates_with_etag_and_reuses_the_cached_render(client: AsyncClient, app, published: dict) -> None:
+    share_slug = published['share_slug']
+    url = f'/api/v1/public/w/{share_slug}'
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url='http://testserver') as anonymous:
+        first = await anonymous.get(url)
+        etag = first.headers['etag']
+        assert first.json()['viewer_kind'] == 'anonymous'
+        assert (await anonymous.get(url, headers={'If-None-Match': etag})).status_code == 304
+
+        with _recorded_statements(app) as statements:
+            cached = await anonymous.get(url)
+        assert cached.json() == first.json()
+        assert not any('FROM wishlist_items' in statement for statement in statements)
+
+        await client.post(f"{url}/items/{published['single_item_id']}/reserve", headers=published['guest_headers'])
+        changed = await anonymous.get(url, headers={'If-None-Match': etag})
+        assert changed.status_code == 200
+        assert changed.headers['etag'] != etag
+        reserved = next(item for item in changed.json()['items'] if item['id'] == published['single_item_id'])
+        assert reserved['is_reserved'] is True
+        assert reserved['reserved_by_you'] is False
+
+        guest = await anonymous.get(url, headers=published['guest_headers'])
+        assert guest.headers['etag'] not in {etag, changed.headers['etag']}
+        assert guest.json()['viewer_kind'] == 'guest'
+        assert next(item for item in guest.json()['items'] if item['id'] == published['single_item_id'])['reserved_by_you'] is True
+
+    owner_etag = (await client.get(url)).headers['etag']
+    await client.patch(f"/api/v1/wishlists/{published['wishlist_id']}", json={'title': 'Birthday party'})
+    renamed = await client.get(url, headers={'If-None-Match': owner_etag})
+    assert renamed.status_code == 200
+    assert renamed.json()['title'] == 'Birthday party'
+    renamed_event = (await client.get(f'{url}/events')).json()['events'][-1]
+    assert (renamed_event['event_type'], renamed_event['item_id']) == ('wishlist_updated', None)
+    assert renamed_event['payload'] == {'wishlist': {'title': 'Birthday party', 'description': None, 'currency': 'RUB'}}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_public_view_loads_share_one_render(client: AsyncClient, app, published: dict) -> None:
+    share_slug = published['share_slug']
+    await client.post(
+        f"/api/v1/public/w/{share_slug}/items/{published['single_item_id']}/reserve",
+        headers=published['guest_headers'],
+    )
+
+    with _recorded_statements(app) as statements:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url='http://testserver') as anonymous:
+            responses = await asyncio.gather(*(anonymous.get(f'/api/v1/public/w/{share_slug}') for _ in range(20)))
+
+    assert {response.status_code for response in responses} == {200}
+    assert len({response.content for response in responses}) == 1
+    assert len([statement for statement in statements if 'FROM wishlist_items' in statement]) == 1
+
+
+@pytest.mark.asyncio
+async def test_contributions_stop_exactly_at_the_target(client: AsyncClient, app, published: dict) -> None:
+    url = f"/api/v1/public/w/{published['share_slug']}/items/{published['group_item_id']}/contributions"
+    accepted = [
+        (await client.post(url, headers=published['guest_headers'], json={'amount': amount})).json()['accepted_amount']
+        for amount in ('6000.00', '3000.00', '2500.00')
+    ]
+    assert accepted == ['6000.00', '3000.00', '1000.00']
+
+    completed = await client.post(url, headers=published['guest_headers'], json={'amount': '1.00'})
+    assert completed.status_code == 409
+    assert completed.json()['detail'] == 'Collection already completed'
+
+    async with app.state.session_factory() as db:
+        total = (await db.execute(select(func.sum(Contribution.amount)))).scalar_one()
+    assert Decimal(total) == Decimal('10000.00')
+
+
+def test_atomic_contribution_is_one_statement_on_postgresql() -> None:
+    statement = atomic_contribution_statement(
+        wishlist=Wishlist(id=uuid.uuid4(), currency='RUB'),
+        item_id=uuid.uuid4(),
+        guest_session_id=uuid.uuid4(),
+        amount=Decimal('100.00'),
+    )
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+
+    assert sql.startswith('WITH locked AS')
+    assert 'FOR UPDATE' in sql
+    assert 'UPDATE wishlist_items SET collected_amount=(locked.collected_amount + least(' in sql
+    assert 'INSERT INTO contributions' in sql
+
+
+@pytest.mark.asyncio
+async def test_reserve_is_a_single_upsert_and_conflicts_are_409(client: AsyncClient, app, published: dict) -> None:
+    share_slug = published['share_slug']
+    url = f"/api/v1/public/w/{share_slug}/items/{published['single_item_id']}/reserve"
+    other_token = (await client.post(f'/api/v1/public/w/{share_slug}/guest-session', json={'name': 'Other'})).json()['token']
+    other_headers = {'X-Guest-Token': other_token}
+
+    with _recorded_statements(app) as statements:
+        assert (await client.post(url, headers=published['guest_headers'])).status_code == 200
+    reservation_statements = [statement for statement in statements if 'reservations' in statement]
+    assert len(reservation_statements) == 1
+    assert 'ON CONFLICT (item_id) DO UPDATE' in reservation_statements[0]
+
+    taken = await client.post(url, headers=other_headers)
+    assert (taken.status_code, taken.json()['detail']) == (409, 'Item is already reserved')
+    assert (await client.post(url, headers=published['guest_headers'])).status_code == 200
+    assert (await client.delete(url, headers=other_headers)).status_code == 403
+
+    assert (await client.delete(url, headers=published['guest_headers'])).status_code == 200
+    assert (await client.delete(url, headers=published['guest_headers'])).status_code == 404
+    assert (await client.post(url, headers=other_headers)).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_retried_contribution_with_the_same_key_is_applied_once(client: AsyncClient, app, published: dict) -> None:
+    url = f"/api/v1/public/w/{published['share_slug']}/items/{published['group_item_id']}/contributions"
+    headers = {**published['guest_headers'], 'Idempotency-Key': 'checkout-1'}
+    first = await client.post(url, headers=headers, json={'amount': '1500.00'})
+    assert first.status_code == 200
+
+    with _recorded_statements(app) as statements:
+        # once from this process's recent responses, once from the stored row
+        cached = await client.post(url, headers=headers, json={'amount': '1500.00'})
+        recent_responses.clear()
+        stored = await client.post(url, headers=headers, json={'amount': '1500.00'})
+
+    for retry in (cached, stored):
+        assert (retry.status_code, retry.json()) == (200, first.json())
+        assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert not any('wishlist_items' in statement or 'contributions' in statement for statement in statements)
+
+    reused = await client.post(url, headers=headers, json={'amount': '10.00'})
+    assert (reused.status_code, reused.json()['detail']) == (422, 'Idempotency-Key was already used for a different request')
+
+    async with app.state.session_factory() as db:
+        assert (await db.execute(select(func.count()).select_from(Contribution))).scalar_one() == 1
+        assert await purge_idempotency_keys(db, older_than_hours=1) == 0
+        assert await purge_idempotency_keys(db, older_than_hours=1, now=datetime.now(UTC) + timedelta(hours=2)) == 1
+        await db.commit()
+
+    recent_responses.clear()
+    assert (await client.post(url, headers=headers, json={'amount': '10.00'})).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_batch_actions_apply_in_one_transaction_with_per_action_results(client: AsyncClient, app, published: dict) -> None:
+    share_slug = published['share_slug']
+    single_item_id, group_item_id = published['single_item_id'], published['group_item_id']
+    events_url = f'/api/v1/public/w/{share_slug}/events'
+    cursor = (await client.get(events_url)).json()['next_cursor']
+    actions = [
+        {'action': 'contribute', 'item_id': group_item_id, 'amount': '4000.00'},
+        {'action': 'unreserve', 'item_id': single_item_id},
+        {'action': 'reserve', 'item_id': single_item_id},
+        {'action': 'contribute', 'item_id': single_item_id, 'amount': '10.00'},
+        {'action': 'reserve', 'item_id': str(uuid.uuid4())},
+    ]
+
+    subscriber = connection_manager.subscribe(share_slug)
+    with _recorded_statements(app) as statements:
+        response = await client.post(f'/api/v1/public/w/{share_slug}/actions', headers=published['guest_headers'], json={'actions': actions})
+
+    assert response.status_code == 200
+    results = response.json()['results']
+    assert [(result['action'], result['status_code'], result['detail']) for result in results] == [
+        ('contribute', 200, None),
+        ('unreserve', 404, 'Reservation not found'),
+        ('reserve', 200, None),
+        ('contribute', 409, 'Only contributions are allowed for this item'),
+        ('reserve', 404, 'Item not found'),
+    ]
+    assert results[0]['result']['accepted_amount'] == '4000.00'
+    assert results[2]['result']['is_reserved'] is True
+    assert len([statement for statement in statements if 'FROM wishlists' in statement]) == 1
+    # all events of the batch take their versions in one update when it commits
+    assert len([statement for statement in statements if 'UPDATE wishlists SET version' in statement]) == 1
+
+    # failed actions roll back to their savepoint without dropping the events of the others
+    events = (await client.get(events_url, params={'cursor': cursor})).json()['events']
+    assert sorted(event['event_type'] for event in events) == ['contribution_added', 'item_reserved']
+    assert [event['version'] for event in events] == [events[0]['version'], events[0]['version'] + 1]
+    broadcast = [frame.message async for frame in _take(subscriber.frames(), 2)]
+    connection_manager.disconnect(share_slug, subscriber)
+    assert [message['id'] for message in broadcast] == [event['id'] for event in events]
+
+    # only the accepted actions were written
+    async with app.state.session_factory() as db:
+        contributions = (await db.execute(select(Contribution.item_id, Contribution.amount))).all()
+        reservations = (await db.execute(select(Reservation.item_id, Reservation.is_active))).all()
+    assert contributions == [(uuid.UUID(group_item_id), Decimal('4000.00'))]
+    assert reservations == [(uuid.UUID(single_item_id), True)]
+
+    invalid = await client.post(
+        f'/api/v1/public/w/{share_slug}/actions',
+        headers=published['guest_headers'],
+        json={'actions': [{'action': 'reserve', 'item_id': single_item_id, 'amount': '5.00'}]},
+    )
+    assert invalid.status_code == 422
@@ -0,0 +1,102 @@
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import event as sa_event
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession, create_async_engine
+
+from app.api.routes.public import _guest_reserved_item_ids
+from app.db.base import Base
+from app.models.enums import WishlistStatus
+from app.models.user import User
+from app.models.wishlist import Wishlist
+from app.models.wishlist_item import WishlistItem
+from app.services.event_service import load_events_after
+from app.services.wishlist_service import (
+    get_guest_contribution_totals,
+    get_public_item_or_404,
+    get_public_wishlist_or_404,
+    get_published_wishlist_or_404,
+)
+
+WISHLIST_ID, ITEM_ID = uuid4(), uuid4()
+
+
+async def _service_plan(conn: AsyncConnection, run) -> str:
+    """Plans every SELECT a service call issues, with the parameters it bound."""
+    statements: list[tuple[str, tuple]] = []
+
+    def record(connection, cursor, statement, parameters, context, executemany) -> None:
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    sa_event.listen(conn.sync_engine, 'before_cursor_execute', record)
+    try:
+        await run(AsyncSession(bind=conn))
+    finally:
+        sa_event.remove(conn.sync_engine, 'before_cursor_execute', record)
+
+    assert statements
+    plans = [await conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters) for statement, parameters in statements]
+    return '\n'.join(row[-1] for result in plans for row in result.all())
+
+
+@pytest.fixture
+async def conn():
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:', future=True)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        async with AsyncSession(bind=connection) as db:
+            owner = User(email='owner@example.com', display_name='Owner')
+            db.add_all([
+                owner,
+                Wishlist(id=WISHLIST_ID, owner=owner, title='Birthday', status=WishlistStatus.PUBLISHED, share_slug='birthday'),
+                WishlistItem(id=ITEM_ID, wishlist_id=WISHLIST_ID, title='Kettle'),
+            ])
+            await db.flush()
+        yield connection
+    await engine.dispose()
+
+
+# each entry is a call the API makes; every SELECT it issues must be served by an index
+HOT_QUERIES = [
+    pytest.param(
+        lambda db: load_events_after(db, WISHLIST_ID, 100, 50),
+        'ix_realtime_events_wishlist_id_id',
+        id='events-after-cursor',
+    ),
+    pytest.param(
+        lambda db: get_guest_contribution_totals(db, uuid4()),
+        'ix_contributions_guest_session_id_item_id',
+        id='guest-contribution-totals',
+    ),
+    pytest.param(
+        lambda db: _guest_reserved_item_ids(db, uuid4()),
+        'ix_reservations_guest_session_id',
+        id='guest-reserved-items',
+    ),
+    pytest.param(
+        lambda db: get_public_item_or_404(db, WISHLIST_ID, ITEM_ID),
+        'sqlite_autoindex_wishlist_items',
+        id='public-item',
+    ),
+    pytest.param(
+        lambda db: get_published_wishlist_or_404(db, 'birthday'),
+        'sqlite_autoindex_wishlists',
+        id='wishlist-by-slug',
+    ),
+    pytest.param(
+        lambda db: get_public_wishlist_or_404(db, 'birthday'),
+        'ix_wishlist_items_wishlist_id_position',
+        id='public-wishlist-items',
+    ),
+]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(('run', 'index'), HOT_QUERIES)
+async def test_hot_queries_use_their_index(conn: AsyncConnection, run, index: str) -> None:
+    plan = await _service_plan(conn, run)
+
+    assert not any(line.startswith('SCAN ') for line in plan.splitlines())
+    assert f'INDEX {index}' in plan
+    assert 'TEMP B-TREE' not in plan
@@ -0,0 +1,507 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any
+from uuid import uuid4
+
+import orjson
+import pytest
+from fastapi import WebSocketDisconnect
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.api.routes.sse import _event_stream
+from app.db.base import Base
+from app.models.enums import EventType
+from app.models.realtime_event import RealtimeEvent
+from app.models.user import User
+from app.realtime.backends import PG_NOTIFY_MAX_BYTES, InMemoryBackend, PostgresBackend, RealtimeBackend
+from app.realtime import frames
+from app.realtime.encoding import negotiate_encoding
+from app.realtime.frames import Frame
+from app.realtime.history import EventHistory
+from app.realtime.manager import ConnectionManager, connection_manager
+from app.realtime.snapshots import SnapshotCache
+from app.services.event_service import publish_event
+
+
+class FakeWebSocket:
+    def __init__(self, *, blocked: bool = False) -> None:
+        self.accepted = False
+        self.close_code: int | None = None
+        self.sent: list[Any] = []
+        self.incoming: asyncio.Queue[str] = asyncio.Queue()
+        self._unblocked = asyncio.Event()
+        if not blocked:
+            self._unblocked.set()
+
+    async def accept(self, subprotocol: str | None = None) -> None:
+        self.accepted = True
+
+    async def send_text(self, text: str) -> None:
+        await self._unblocked.wait()
+        self.sent.append(orjson.loads(text))
+
+    async def receive_text(self) -> str:
+        return await self.incoming.get()
+
+    async def close(self, code: int = 1000) -> None:
+        self.close_code = code
+
+
+async def _drain() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_broadcast_reaches_sockets_on_other_workers() -> None:
+    backend = InMemoryBackend()
+    worker_a = ConnectionManager()
+    worker_b = ConnectionManager()
+    await worker_a.start(backend)
+    await worker_b.start(backend)
+
+    socket_a = FakeWebSocket()
+    socket_b = FakeWebSocket()
+    await worker_a.connect('birthday', socket_a)
+    await worker_b.connect('birthday', socket_b)
+
+    await worker_a.broadcast('birthday', {'id': 1, 'event_type': 'item_reserved'})
+    await _drain()
+
+    assert socket_a.sent == [{'id': 1, 'event_type': 'item_reserved'}]
+    assert socket_b.sent == [{'id': 1, 'event_type': 'item_reserved'}]
+
+    await worker_a.stop()
+
+
+def test_backend_missing_a_method_cannot_be_created() -> None:
+    class ListenOnlyBackend(RealtimeBackend):
+        async def start(self, handler, on_gap=None) -> None:
+            pass
+
+        async def stop(self) -> None:
+            pass
+
+    with pytest.raises(TypeError, match='publish'):
+        ListenOnlyBackend()
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_does_not_stall_other_sockets() -> None:
+    manager = ConnectionManager(max_queue=2, slow_consumer_policy='disconnect')
+    slow = FakeWebSocket(blocked=True)
+    fast = FakeWebSocket()
+    await manager.connect('birthday', slow)
+    await manager.connect('birthday', fast)
+
+    for event_id in range(1, 5):
+        await manager.broadcast('birthday', {'id': event_id})
+        await _drain()
+
+    assert [message['id'] for message in fast.sent] == [1, 2, 3, 4]
+    assert slow.sent == []
+    assert slow.close_code == 1013
+
+
+@pytest.mark.asyncio
+async def test_failed_sends_close_the_subscriber_and_log_unexpected_errors(
+    caplog: pytest.LogCaptureFixture,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    class GoneWebSocket(FakeWebSocket):
+        async def send_text(self, text: str) -> None:
+            raise WebSocketDisconnect(1006)
+
+    def broken_encoder(message: Any, encoding: str) -> str:
+        raise TypeError('Type is not JSON serializable')
+
+    monkeypatch.setattr(frames, 'encode_message', broken_encoder)
+    manager = ConnectionManager()
+    gone = await manager.connect('birthday', GoneWebSocket())
+    broken = await manager.connect('birthday', FakeWebSocket(), encoding='compact')
+
+    with caplog.at_level(logging.DEBUG, logger='app.realtime.manager'):
+        await manager.broadcast('birthday', {'id': 1})
+        await _drain()
+
+    assert gone.is_closing and broken.is_closing
+    assert [record.message for record in caplog.records] == ['Dropping realtime websocket after a failed send']
+    assert caplog.records[0].exc_info is not None
+
+
+@pytest.mark.asyncio
+async def test_drop_oldest_policy_keeps_latest_messages() -> None:
+    manager = ConnectionManager(max_queue=2, slow_consumer_policy='drop_oldest')
+    socket = FakeWebSocket(blocked=True)
+    subscriber = await manager.connect('birthday', socket)
+
+    for event_id in range(1, 5):
+        await manager.broadcast('birthday', {'id': event_id})
+
+    assert subscriber.dropped == 2
+    socket._unblocked.set()
+    await _drain()
+    assert [message['id'] for message in socket.sent] == [3, 4]
+
+
+@pytest.mark.asyncio
+async def test_events_are_delivered_only_after_commit() -> None:
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:', future=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    socket = FakeWebSocket()
+    subscriber = await connection_manager.connect('post-commit', socket)
+    try:
+        async with session_factory() as db:
+            await db.execute(select(RealtimeEvent.id))
+            await publish_event(
+                db,
+                wishlist_id=uuid4(),
+                share_slug='post-commit',
+                event_type=EventType.ITEM_UPDATED,
+                payload={'action': 'rolled-back'},
+            )
+            await _drain()
+            assert socket.sent == []
+            await db.rollback()
+
+            await db.execute(select(RealtimeEvent.id))
+
+            await publish_event(
+                db,
+                wishlist_id=uuid4(),
+                share_slug='post-commit',
+                event_type=EventType.ITEM_UPDATED,
+                payload={'action': 'committed'},
+            )
+            await db.commit()
+        await _drain()
+    finally:
+        connection_manager.disconnect('post-commit', subscriber)
+        await engine.dispose()
+
+    assert [message['payload']['action'] for message in socket.sent] == ['committed']
+
+
+@pytest.mark.asyncio
+async def test_rolled_back_savepoint_drops_only_its_own_writes_and_events() -> None:
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:', future=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def publish(db, action: str) -> None:
+        await publish_event(
+            db,
+            wishlist_id=uuid4(),
+            share_slug='savepoints',
+            event_type=EventType.ITEM_UPDATED,
+            payload={'action': action},
+        )
+
+    socket = FakeWebSocket()
+    subscriber = await connection_manager.connect('savepoints', socket)
+    try:
+        async with session_factory() as db:
+            await db.execute(select(RealtimeEvent.id))
+            async with db.begin_nested():
+                await publish(db, 'first')
+            await _drain()
+            assert socket.sent == []
+
+            savepoint = await db.begin_nested()
+            await publish(db, 'rejected')
+            db.add(User(email='rejected@example.com', display_name='Rejected'))
+            await db.flush()
+            await savepoint.rollback()
+
+            async with db.begin_nested():
+                await publish(db, 'last')
+            await db.commit()
+        await _drain()
+
+        async with session_factory() as db:
+            stored = (await db.execute(select(RealtimeEvent.payload).order_by(RealtimeEvent.id))).scalars().all()
+            users = (await db.execute(select(User.id))).scalars().all()
+    finally:
+        connection_manager.disconnect('savepoints', subscriber)
+        await engine.dispose()
+
+    assert [message['payload']['action'] for message in socket.sent] == ['first', 'last']
+    assert [payload['action'] for payload in stored] == ['first', 'last']
+    assert users == []
+
+
+@pytest.mark.asyncio
+async def test_buffered_events_keep_emission_order() -> None:
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:', future=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    socket = FakeWebSocket()
+    subscriber = await connection_manager.connect('batched', socket)
+    try:
+        async with session_factory() as db:
+            await db.execute(select(RealtimeEvent.id))
+            for index in range(3):
+                await publish_event(
+                    db,
+                    wishlist_id=uuid4(),
+                    share_slug='batched',
+                    event_type=EventType.ITEM_UPDATED,
+                    payload={'index': index},
+                )
+            assert (await db.execute(select(RealtimeEvent.id))).all() == []
+            await db.commit()
+        await _drain()
+    finally:
+        connection_manager.disconnect('batched', subscriber)
+        await engine.dispose()
+
+    assert [message['payload']['index'] for message in socket.sent] == [0, 1, 2]
+    ids = [message['id'] for message in socket.sent]
+    assert ids == sorted(ids)
+
+
+def test_history_serves_only_cursors_inside_its_window() -> None:
+    history = EventHistory(size=3, max_channels=10)
+    for event_id in (10, 12, 15, 21):
+        history.append('birthday', Frame({'id': event_id}))
+
+    assert history.since('birthday', 9) is None
+    assert [event_id for event_id, _ in history.since('birthday', 10)] == [12, 15, 21]
+    assert [event_id for event_id, _ in history.since('birthday', 11)] == [12, 15, 21]
+    assert [event_id for event_id, _ in history.since('birthday', 15)] == [21]
+    assert history.since('birthday', 21) == []
+    assert history.since('unknown', 0) is None
+
+
+class RecordingPool:
+    def __init__(self) -> None:
+        self.notified: list[str] = []
+
+    async def execute(self, query: str, channel: str, payload: str) -> None:
+        self.notified.append(payload)
+
+
+@pytest.mark.asyncio
+async def test_oversized_notifications_keep_the_version_and_are_not_replayed_from_history() -> None:
+    backend = PostgresBackend('postgresql://unused')
+    backend._pool = pool = RecordingPool()
+    event = {
+        'id': 31,
+        'event_type': 'item_updated',
+        'wishlist_id': 'w1',
+        'item_id': 'i1',
+        'payload': {'notes': 'x' * PG_NOTIFY_MAX_BYTES},
+        'version': 7,
+        'created_at': '2026-10-17T09:00:00+00:00',
+    }
+    await backend.publish('birthday', Frame(event), 'origin')
+    _, _, text = pool.notified[0].split('\n', 2)
+    stub = Frame(text=text)
+    assert stub.truncated
+    assert (stub.message['payload'], stub.version, stub.message['wishlist_id']) == ({}, 7, 'w1')
+
+    history = EventHistory(size=10, max_channels=10)
+    history.append('birthday', Frame({'id': 30, 'wishlist_id': 'w1', 'version': 6}))
+    history.append('birthday', stub)
+    history.append('birthday', Frame({'id': 32, 'wishlist_id': 'w1', 'version': 8}))
+    # cursors before the truncated event fall back to the database
+    assert history.since('birthday', 30) is None
+    assert history.since('birthday', 31) is None
+    assert [event_id for event_id, _ in history.since('birthday', 32)] == []
+
+
+@pytest.mark.asyncio
+async def test_resume_replays_backlog_before_live_frames_without_duplicates() -> None:
+    manager = ConnectionManager()
+    socket = FakeWebSocket()
+    subscriber = await manager.connect('birthday', socket, paused=True)
+
+    await manager.broadcast('birthday', {'id': 3})
+    await manager.broadcast('birthday', {'id': 4})
+    subscriber.replay([Frame({'id': 2}), Frame({'id': 3})])
+    subscriber.resume(after_id=3)
+    await _drain()
+
+    assert [message['id'] for message in socket.sent] == [2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_sse_stream_sends_shared_frames_and_keepalives() -> None:
+    subscriber = connection_manager.subscribe('sse-channel')
+    stream = _event_stream('sse-channel', subscriber, keepalive=0.05)
+
+    assert await anext(stream) == b'retry: 2000\n\n'
+    assert await anext(stream) == b': keepalive\n\n'
+
+    frame = Frame({'id': 7, 'event_type': 'item_reserved'})
+    connection_manager.broadcast_nowait('sse-channel', frame)
+    assert await anext(stream) == b'id: 7\ndata: {"id":7,"event_type":"item_reserved"}\n\n'
+    assert frame.sse is frame.sse
+
+    await stream.aclose()
+    assert subscriber.is_closing
+
+
+@pytest.mark.asyncio
+async def test_coalescing_window_merges_item_bursts_into_one_array_frame() -> None:
+    manager = ConnectionManager(coalesce_window=0.05)
+    socket = FakeWebSocket()
+    await manager.connect('birthday', socket)
+
+    def item_event(event_id: int, item_id: str, collected: str) -> dict[str, Any]:
+        return {
+            'id': event_id,
+            'item_id': item_id,
+            'version': event_id,
+            'payload': {'item': {'id': item_id, 'collected_amount': collected}},
+        }
+
+    await manager.broadcast('birthday', item_event(1, 'a', '100.00'))
+    await manager.broadcast('birthday', item_event(2, 'b', '50.00'))
+    await manager.broadcast('birthday', {'id': 3, 'version': 3, 'payload': {'status': 'closed'}})
+    await manager.broadcast('birthday', item_event(4, 'a', '300.00'))
+    await _drain()
+    assert socket.sent == []
+    assert [event_id for event_id, _ in manager.history.since('birthday', 1)] == [2, 3, 4]
+
+    await asyncio.sleep(0.1)
+
+    assert len(socket.sent) == 1
+    batch = socket.sent[0]
+    assert [message['id'] for message in batch] == [2, 3, 4]
+    assert batch[-1]['payload']['item']['collected_amount'] == '300.00'
+    assert batch[-1]['coalesced_from'] == [1]
+    assert batch[-1]['first_version'] == 1
+
+
+@pytest.mark.asyncio
+async def test_snapshot_cache_renders_once_per_version_under_a_connection_storm() -> None:
+    cache = SnapshotCache(max_channels=10)
+    renders: list[int] = []
+
+    def render(version: int):
+        async def _render() -> Frame:
+            renders.append(version)
+            await asyncio.sleep(0.01)
+            return Frame({'type': 'snapshot', 'version': version})
+
+        return _render
+
+    frames = await asyncio.gather(*(cache.get('birthday', 3, render(3)) for _ in range(50)))
+    assert renders == [3]
+    assert all(frame is frames[0] for frame in frames)
+
+    assert await cache.get('birthday', 3, render(3)) is frames[0]
+    assert (await cache.get('birthday', 4, render(4))).message['version'] == 4
+    assert renders == [3, 4]
+
+
+@pytest.mark.asyncio
+async def test_listen_answers_pings_and_reaps_silent_sockets() -> None:
+    manager = ConnectionManager()
+    socket = FakeWebSocket()
+    subscriber = await manager.connect('birthday', socket)
+    assert manager.connection_count == 1
+
+    await socket.incoming.put('ping')
+    await asyncio.wait_for(subscriber.listen(ping_interval=0.02, idle_timeout=0.07), timeout=1)
+    manager.disconnect('birthday', subscriber)
+    await _drain()
+
+    assert socket.sent[0] == {'type': 'pong'}
+    assert {'type': 'ping'} in socket.sent[1:]
+    assert socket.close_code == 1001
+    assert manager.connection_count == 0
+
+
+@pytest.mark.asyncio
+async def test_connection_caps_apply_per_channel_and_globally() -> None:
+    manager = ConnectionManager(max_connections=3, max_connections_per_channel=2)
+
+    first = manager.subscribe('birthday')
+    manager.subscribe('birthday')
+    assert not manager.has_capacity('birthday')
+    assert manager.has_capacity('wedding')
+
+    manager.subscribe('wedding')
+    assert not manager.has_capacity('wedding')
+
+    manager.disconnect('birthday', first)
+    assert manager.has_capacity('birthday')
+
+
+def test_encoding_negotiation_prefers_query_flag_then_offered_subprotocols() -> None:
+    assert negotiate_encoding([]) == ('json', None)
+    assert negotiate_encoding(['chat', 'wishlist.compact']) == ('compact', 'wishlist.compact')
+    assert negotiate_encoding(['wishlist.json', 'wishlist.compact'], 'compact') == ('compact', 'wishlist.compact')
+    assert negotiate_encoding([], 'compact') == ('compact', None)
+
+
+@pytest.mark.asyncio
+async def test_compact_encoding_drops_repeated_keys_and_is_cached_per_frame() -> None:
+    manager = ConnectionManager()
+    socket = FakeWebSocket()
+    await manager.connect('birthday', socket, encoding='compact')
+
+    message = {
+        'id': 5,
+        'event_type': 'item_reserved',
+        'wishlist_id': 'w-1',
+        'item_id': 'i-1',
+        'payload': {'item_id': 'i-1'},
+        'version': 3,
+        'created_at': '2026-10-16T12:00:00+00:00',
+    }
+    frame = Frame(message)
+    await manager.broadcast('birthday', frame)
+    await _drain()
+
+    assert socket.sent == [[5, 'item_reserved', 'w-1', 'i-1', {'item_id': 'i-1'}, 3, '2026-10-16T12:00:00+00:00']]
+    assert frame.encode('compact') is frame.encode('compact')
+    assert len(frame.encode('compact')) < len(frame.text)
+    assert Frame({'type': 'ping'}).encode('compact') == '{"type":"ping"}'
+
+
+def test_msgpack_encoding_round_trips_the_compact_form() -> None:
+    msgpack = pytest.importorskip('msgpack')
+    frame = Frame([{'id': 1, 'event_type': 'item_updated', 'payload': {}, 'version': 2, 'first_version': 1}])
+
+    assert msgpack.unpackb(frame.encode('msgpack')) == [[1, 'item_updated', None, None, {}, 2, None, None, 1]]
+
+
+def test_history_drops_what_it_has_when_a_version_is_skipped() -> None:
+    history = EventHistory(size=10, max_channels=10)
+    history.append('owner:1', Frame({'id': 1, 'wishlist_id': 'w1', 'version': 1}))
+    history.append('owner:1', Frame({'id': 2, 'wishlist_id': 'w2', 'version': 1}))
+    history.append('owner:1', Frame({'id': 3, 'wishlist_id': 'w1', 'version': 2}))
+    assert [event_id for event_id, _ in history.since('owner:1', 1)] == [2, 3]
+
+    # version 3 of w1 never arrived
+    history.append('owner:1', Frame({'id': 5, 'wishlist_id': 'w1', 'version': 4}))
+    assert history.since('owner:1', 3) is None
+    assert history.since('owner:1', 5) == []
+
+
+@pytest.mark.asyncio
+async def test_listener_reconnect_clears_the_history() -> None:
+    manager = ConnectionManager()
+    backend = PostgresBackend('postgresql://unused', reconnect_delay=0)
+    manager.history.append('birthday', Frame({'id': 1, 'wishlist_id': 'w1', 'version': 1}))
+    assert manager.history.since('birthday', 1) == []
+
+    async def listen() -> None:
+        pass
+
+    backend._listen = listen
+    backend._on_gap = manager._on_backend_gap
+    await backend._reconnect()
+    assert manager.history.since('birthday', 1) is None
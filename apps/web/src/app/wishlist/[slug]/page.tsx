@@ -12,7 +12,9 @@ import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Input } from '@/components/ui/input';
 import { useWishlistRealtime } from '@/hooks/use-wishlist-realtime';
 import { publicApi } from '@/lib/api';
+import { PublicWishlistView } from '@/lib/contracts';
 import { getGuestToken, setGuestToken } from '@/lib/guest-session';
+import { applyRealtimeEvents } from '@/lib/realtime';
 
 export default function PublicWishlistPage() {
   const params = useParams<{ slug: string }>();
@@ -38,7 +40,14 @@ export default function PublicWishlistPage() {
 
   useWishlistRealtime({
     shareSlug: slug,
-    onEvent: () => {
+    onEvents: (events) => {
+      const queryKey = ['public-wishlist', slug, guestToken];
+      const current = queryClient.getQueryData<PublicWishlistView>(queryKey);
+      const next = current ? applyRealtimeEvents(current, events) : null;
+      if (next) {
+        queryClient.setQueryData(queryKey, next);
+        return;
+      }
       queryClient.invalidateQueries({ queryKey: ['public-wishlist', slug] });
     },
   });
@@ -7,12 +7,12 @@ import { RealtimeEvent } from '@/lib/contracts';
 
 interface UseWishlistRealtimeOptions {
   shareSlug?: string | null;
-  onEvent: (event: RealtimeEvent) => void;
+  onEvents: (events: RealtimeEvent[]) => void;
 }
 
-export function useWishlistRealtime({ shareSlug, onEvent }: UseWishlistRealtimeOptions) {
-  const onEventRef = useRef(onEvent);
-  onEventRef.current = onEvent;
+export function useWishlistRealtime({ shareSlug, onEvents }: UseWishlistRealtimeOptions) {
+  const onEventsRef = useRef(onEvents);
+  onEventsRef.current = onEvents;
 
   useEffect(() => {
     if (!shareSlug) return;
@@ -28,8 +28,13 @@ export function useWishlistRealtime({ shareSlug, onEvent }: UseWishlistRealtimeO
 
       socket.onmessage = (message) => {
         try {
-          const payload = JSON.parse(message.data) as RealtimeEvent;
-          onEventRef.current(payload);
+          const payload = JSON.parse(message.data) as RealtimeEvent | RealtimeEvent[] | { type: string };
+          if (!Array.isArray(payload) && 'type' in payload) {
+            // liveness frames: answering a server ping keeps the socket from being reaped
+            if (payload.type === 'ping') socket?.send('pong');
+            return;
+          }
+          onEventsRef.current(Array.isArray(payload) ? payload : [payload]);
         } catch {
           // ignore malformed messages
         }
@@ -0,0 +1,124 @@
+import { describe, expect, it } from 'vitest';
+
+import { GuestItemView, PublicWishlistView, RealtimeEvent } from '@/lib/contracts';
+import { applyRealtimeEvent, applyRealtimeEvents } from '@/lib/realtime';
+
+const guestItem: GuestItemView = {
+  id: 'item-1',
+  title: 'Headphones',
+  product_url: null,
+  image_url: null,
+  notes: null,
+  price: null,
+  mode: 'group',
+  target_amount: '10000.00',
+  collected_amount: '0.00',
+  status: 'active',
+  position: 0,
+  is_reserved: false,
+  reserved_by_you: false,
+  my_contribution: '500.00',
+  progress_percent: 0,
+};
+
+const view: PublicWishlistView = {
+  id: 'wishlist-1',
+  title: 'Birthday',
+  description: null,
+  currency: 'RUB',
+  status: 'published',
+  share_slug: 'birthday',
+  version: 4,
+  viewer_kind: 'guest',
+  items: [guestItem],
+};
+
+function contributionEvent(version: number | null): RealtimeEvent {
+  const { reserved_by_you: _reservedByYou, my_contribution: _myContribution, ...state } = guestItem;
+  return {
+    id: 10,
+    event_type: 'contribution_added',
+    wishlist_id: view.id,
+    item_id: guestItem.id,
+    payload: { item: { ...state, collected_amount: '2500.00', progress_percent: 25 } },
+    version,
+    created_at: '2026-10-16T12:00:00Z',
+  };
+}
+
+describe('applyRealtimeEvent', () => {
+  it('applies the next version and keeps guest-specific fields', () => {
+    const next = applyRealtimeEvent(view, contributionEvent(5));
+    expect(next?.version).toBe(5);
+    const item = next?.items[0] as GuestItemView;
+    expect(item.collected_amount).toBe('2500.00');
+    expect(item.my_contribution).toBe('500.00');
+  });
+
+  it('ignores versions that are already applied', () => {
+    expect(applyRealtimeEvent(view, contributionEvent(4))).toBe(view);
+  });
+
+  it('asks for a refetch on a version gap', () => {
+    expect(applyRealtimeEvent(view, contributionEvent(7))).toBeNull();
+    expect(applyRealtimeEvent(view, contributionEvent(null))).toBeNull();
+  });
+});
+
+describe('applyRealtimeEvents', () => {
+  it('applies a coalesced batch that skips merged versions', () => {
+    const statusEvent: RealtimeEvent = {
+      id: 11,
+      event_type: 'wishlist_closed',
+      wishlist_id: view.id,
+      item_id: null,
+      payload: { status: 'closed' },
+      version: 6,
+      created_at: '2026-10-16T12:00:01Z',
+    };
+    const merged = { ...contributionEvent(7), id: 12, coalesced_from: [10], first_version: 5 };
+
+    const next = applyRealtimeEvents(view, [statusEvent, merged]);
+    expect(next?.version).toBe(7);
+    expect(next?.status).toBe('closed');
+    expect(next?.items[0].collected_amount).toBe('2500.00');
+  });
+
+  it('asks for a refetch when the batch starts after a gap', () => {
+    expect(applyRealtimeEvents(view, [{ ...contributionEvent(7), first_version: 6 }])).toBeNull();
+  });
+
+  it('asks for a refetch when an event arrives without its payload', () => {
+    expect(applyRealtimeEvents(view, [{ ...contributionEvent(5), payload: {}, truncated: true }])).toBeNull();
+  });
+});
+
+describe('wishlist details', () => {
+  it('applies title and description changes', () => {
+    const next = applyRealtimeEvent(view, {
+      id: 13,
+      event_type: 'wishlist_updated',
+      wishlist_id: view.id,
+      item_id: null,
+      payload: { wishlist: { title: 'Birthday party', description: 'Saturday', currency: 'RUB' } },
+      version: 5,
+      created_at: '2026-10-17T09:00:00Z',
+    });
+    expect(next?.title).toBe('Birthday party');
+    expect(next?.description).toBe('Saturday');
+    expect(next?.items).toHaveLength(1);
+  });
+
+  it('asks for a refetch when a wishlist update carries no details', () => {
+    const next = applyRealtimeEvent(view, {
+      id: 14,
+      event_type: 'wishlist_updated',
+      wishlist_id: view.id,
+      item_id: null,
+      payload: {},
+      version: 5,
+      created_at: '2026-10-17T09:00:00Z',
+    });
+    expect(next).toBeNull();
+  });
+});
@@ -2,6 +2,8 @@
   AuthResponse,
   ContributionResponse,
   EventsResponse,
+  GuestAction,
+  GuestActionsResponse,
   GuestSessionResponse,
   ItemPreviewResponse,
   OwnerWishlistDetail,
@@ -183,6 +185,13 @@ export const publicApi = {
       body: JSON.stringify({ amount }),
     });
   },
+  applyActions(shareSlug: string, guestToken: string, actions: GuestAction[]) {
+    return apiFetch<GuestActionsResponse>(`/public/w/${shareSlug}/actions`, {
+      method: 'POST',
+      headers: guestHeaders(guestToken),
+      body: JSON.stringify({ actions }),
+    });
+  },
   events(shareSlug: string, cursor?: number) {
     const query = cursor ? `?cursor=${cursor}` : '';
     return apiFetch<EventsResponse>(`/public/w/${shareSlug}/events${query}`);
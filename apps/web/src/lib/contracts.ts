@@ -69,6 +69,7 @@ export interface PublicWishlistView {
   currency: string;
   status: WishlistStatus;
   share_slug: string;
+  version: number;
   viewer_kind: 'anonymous' | 'guest' | 'owner';
   items: OwnerItemView[] | GuestItemView[];
 }
@@ -80,17 +81,52 @@ export interface GuestSessionResponse {
   expires_at: string;
 }
 
+export interface RealtimeEventPayload {
+  item_id?: string;
+  item?: OwnerItemView;
+  item_ids?: string[];
+  status?: WishlistStatus;
+  wishlist?: Pick<PublicWishlistView, 'title' | 'description' | 'currency'>;
+  [key: string]: unknown;
+}
+
 export interface RealtimeEvent {
   id: number;
   event_type: string;
+  wishlist_id: string;
   item_id: string | null;
-  payload: Record<string, unknown>;
+  payload: RealtimeEventPayload;
+  version: number | null;
   created_at: string;
+  coalesced_from?: number[];
+  first_version?: number | null;
+  // the payload was too large for cross-worker fan-out and is empty here
+  truncated?: boolean;
+}
+
+export interface RealtimeSnapshot {
+  type: 'snapshot';
+  version: number;
+  wishlist: PublicWishlistView;
+}
+
+export type RealtimeEncoding = 'json' | 'compact' | 'msgpack';
+
+export interface RoutedRealtimeEvent {
+  channel: string;
+  event: RealtimeEvent | RealtimeEvent[];
+}
+
+export interface RealtimeCommandReply {
+  type: 'subscribed' | 'unsubscribed' | 'error';
+  channel: string | null;
+  detail?: string;
 }
 
 export interface EventsResponse {
   events: RealtimeEvent[];
   next_cursor: number | null;
+  resync: boolean;
 }
 
 export interface ContributionResponse {
@@ -101,6 +137,28 @@ export interface ContributionResponse {
   progress_percent: number;
 }
 
+export interface ReservationResponse {
+  message: string;
+  item_id: string;
+  is_reserved: boolean;
+}
+
+export type GuestAction =
+  | { action: 'reserve' | 'unreserve'; item_id: string }
+  | { action: 'contribute'; item_id: string; amount: string };
+
+export interface GuestActionResult {
+  action: GuestAction['action'];
+  item_id: string;
+  status_code: number;
+  detail: string | null;
+  result: ReservationResponse | ContributionResponse | null;
+}
+
+export interface GuestActionsResponse {
+  results: GuestActionResult[];
+}
+
 export interface ItemPreviewResponse {
   title: string | null;
   image_url: string | null;
@@ -0,0 +1,72 @@
+import { GuestItemView, OwnerItemView, PublicWishlistView, RealtimeEvent } from '@/lib/contracts';
+
+type ViewItem = OwnerItemView | GuestItemView;
+
+function mergeItem(view: PublicWishlistView, state: OwnerItemView, previous?: ViewItem): ViewItem {
+  if (view.viewer_kind === 'owner') return state;
+
+  const guestPrevious = previous as GuestItemView | undefined;
+  return {
+    ...state,
+    reserved_by_you: state.is_reserved ? (guestPrevious?.reserved_by_you ?? false) : false,
+    my_contribution: guestPrevious?.my_contribution ?? '0',
+  };
+}
+
+function applyDelta(view: PublicWishlistView, event: RealtimeEvent): PublicWishlistView | null {
+  const { payload } = event;
+  let items: ViewItem[] = [...view.items];
+  let status = view.status;
+  let details = {};
+
+  if (event.event_type === 'wishlist_updated') {
+    if (!payload.wishlist) return null;
+    details = payload.wishlist;
+  } else if (payload.item) {
+    const state = payload.item;
+    const index = items.findIndex((item) => item.id === state.id);
+    if (state.status === 'archived') {
+      items = items.filter((item) => item.id !== state.id);
+    } else if (index >= 0) {
+      items[index] = mergeItem(view, state, items[index]);
+    } else {
+      items.push(mergeItem(view, state));
+    }
+  } else if (payload.item_ids) {
+    const positions = new Map(payload.item_ids.map((itemId, position) => [itemId, position]));
+    items = items.map((item) => ({ ...item, position: positions.get(item.id) ?? item.position }));
+  } else if (payload.status) {
+    status = payload.status;
+  } else {
+    return null;
+  }
+
+  items.sort((left, right) => left.position - right.position);
+
+  return { ...view, ...details, status, version: event.version as number, items } as PublicWishlistView;
+}
+
+/**
+ * Applies a batch of realtime deltas (one socket frame) to a cached public view.
+ * Coalesced events cover every version from their `first_version`, so the batch only has to
+ * start right after the cached version. Returns null when the view must be refetched.
+ */
+export function applyRealtimeEvents(view: PublicWishlistView, events: RealtimeEvent[]): PublicWishlistView | null {
+  if (events.some((event) => event.version == null || event.truncated)) return null;
+
+  const firstVersion = Math.min(...events.map((event) => event.first_version ?? (event.version as number)));
+  if (firstVersion > view.version + 1) return null;
+
+  let next = view;
+  for (const event of events) {
+    if ((event.version as number) <= next.version) continue;
+    const applied = applyDelta(next, event);
+    if (!applied) return null;
+    next = applied;
+  }
+  return next;
+}
+
+export function applyRealtimeEvent(view: PublicWishlistView, event: RealtimeEvent): PublicWishlistView | null {
+  return applyRealtimeEvents(view, [event]);
+}